@@ -1,14 +1,25 @@
-import random
+import itertools
+import math
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
 import matplotlib.pyplot as plt
+from rng import CounterRNG, make_rng, numpy_generator
 
 class SecureSumProtocol:
-    def __init__(self, num_nodes, N=1000):
+    def __init__(self, num_nodes, N=1000, rng=None, values=None):
         self.num_nodes = num_nodes
         self.N = N   # wartość w której mieści się suma wszystkich nodów
-        self.values = [random.randint(0, 100) for _ in range(num_nodes)]
+        # źródło losowości (API random.Random); domyślnie szybki generator symulacyjny
+        self.rng = rng if rng is not None else make_rng("sim")
+        self.np_rng = numpy_generator(self.rng)  # dla wersji wsadowych
+        # values - gotowe prywatne wartości (np. ta sama instancja protokołu w kilku procesach)
+        if values is None:
+            values = [self.rng.randint(0, 100) for _ in range(num_nodes)]
+        self.values = list(values)
 
     def real_world_execution(self, initiator_id=0):
-        R = random.randint(1, self.N - 1)
+        R = self.rng.randint(1, self.N - 1)
         transcript = []
 
         y_current = (self.values[initiator_id] + R) % self.N
@@ -25,7 +36,7 @@ class SecureSumProtocol:
         transcript = []
 
         for i in range(self.num_nodes):
-            y_sim = random.randint(0, self.N - 1)
+            y_sim = self.rng.randint(0, self.N - 1)
             transcript.append(y_sim)
 
         return transcript
@@ -34,7 +45,7 @@ class SecureSumProtocol:
         """Returns the view of a specific node in real execution"""
         ring_pos = (node_id - initiator_id) % self.num_nodes
 
-        R = random.randint(1, self.N - 1)
+        R = self.rng.randint(1, self.N - 1)
         y_current = (self.values[initiator_id] + R) % self.N
 
         for i in range(1, ring_pos):
@@ -49,10 +60,63 @@ class SecureSumProtocol:
             'y_outgoing': y_outgoing,
         }
 
+    # --- wersje wsadowe: wszystkie próby naraz jako tablice (trials x num_nodes) ---
+
+    def _ring_prefix_sums(self, initiator_id):
+        # sumy prefiksowe wartości w kolejności pierścienia zaczynając od inicjatora
+        order = (initiator_id + np.arange(self.num_nodes)) % self.num_nodes
+        return np.cumsum(np.asarray(self.values, dtype=np.int64)[order])
+
+    def real_world_batch(self, num_trials, initiator_id=0, rng=None):
+        """Jak real_world_execution, ale dla num_trials prób naraz - wiersz = transkrypt"""
+        rng = rng if rng is not None else self.np_rng
+        R = rng.integers(1, self.N - 1, size=(num_trials, 1), endpoint=True)
+        return (R + self._ring_prefix_sums(initiator_id)) % self.N
+
+    def ideal_world_batch(self, num_trials, rng=None):
+        rng = rng if rng is not None else self.np_rng
+        return rng.integers(0, self.N, size=(num_trials, self.num_nodes))
+
+    def honest_but_curious_view_batch(self, node_id, num_trials, initiator_id=0, rng=None):
+        """Jak honest_but_curious_view dla num_trials prób - kolumny: y_incoming, y_outgoing"""
+        rng = rng if rng is not None else self.np_rng
+        ring_pos = (node_id - initiator_id) % self.num_nodes
+        prefix = self._ring_prefix_sums(initiator_id)[max(ring_pos - 1, 0)]
+        R = rng.integers(1, self.N - 1, size=num_trials, endpoint=True)
+        y_incoming = (R + prefix) % self.N
+        y_outgoing = (y_incoming + self.values[node_id]) % self.N
+        return np.column_stack((y_incoming, y_outgoing))
+
+    def ideal_world_view_batch(self, num_trials, rng=None):
+        rng = rng if rng is not None else self.np_rng
+        return rng.integers(0, self.N, size=(num_trials, 2))
+
+    def additive_sharing_execution(self):
+        """Wariant bez pierścienia: każdy węzeł dzieli wartość na num_nodes udziałów mod N
+        i rozsyła je równolegle, potem każdy publikuje sumę otrzymanych udziałów.
+        Zwraca (udziały[nadawca][odbiorca], opublikowane sumy częściowe)"""
+        shares = []
+        for i in range(self.num_nodes):
+            row = [self.rng.randint(0, self.N - 1) for _ in range(self.num_nodes - 1)]
+            row.append((self.values[i] - sum(row)) % self.N)
+            shares.append(row)
+
+        partials = [sum(shares[i][j] for i in range(self.num_nodes)) % self.N
+                    for j in range(self.num_nodes)]
+        return shares, partials
+
+    def additive_sharing_view(self, node_id):
+        """Udziały, które node_id dostaje od pozostałych węzłów"""
+        shares, _ = self.additive_sharing_execution()
+        return [shares[i][node_id] for i in range(self.num_nodes) if i != node_id]
+
+    def ideal_sharing_view(self):
+        return [self.rng.randint(0, self.N - 1) for _ in range(self.num_nodes - 1)]
+
     def ideal_world_view(self):
         return {
-            'y_incoming': random.randint(0, self.N - 1),
-            'y_outgoing': random.randint(0, self.N - 1),
+            'y_incoming': self.rng.randint(0, self.N - 1),
+            'y_outgoing': self.rng.randint(0, self.N - 1),
         }
 
 
@@ -70,27 +134,252 @@ def statistical_test(real_samples, ideal_samples, num_bins=20):
     plt.tight_layout()
     plt.show()
 
-def experiment_complete_transcripts():
+class StreamingHistogram:
+    """Histogram o stałej liczbie przedziałów na [low, high) zliczany paczkami.
+
+    Pamięć nie zależy od liczby próbek - kolejne paczki są od razu
+    wrzucane do tablicy liczników, a histogramy z różnych źródeł
+    (np. procesów) można łączyć przez merge.
+    """
+
+    def __init__(self, low, high, num_bins=20):
+        self.low = low
+        self.high = high
+        self.num_bins = num_bins
+        self.counts = np.zeros(num_bins, dtype=np.int64)
+
+    @property
+    def edges(self):
+        return np.linspace(self.low, self.high, self.num_bins + 1)
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def add(self, samples):
+        samples = np.asarray(samples).ravel()
+        bins = (samples - self.low) * self.num_bins // (self.high - self.low)
+        np.clip(bins, 0, self.num_bins - 1, out=bins)
+        self.counts += np.bincount(bins.astype(np.intp), minlength=self.num_bins)
+
+    def merge(self, other):
+        if (other.low, other.high, other.num_bins) != (self.low, self.high, self.num_bins):
+            raise ValueError("histograms have different binning")
+        self.counts += other.counts
+        return self
+
+    def export(self, path):
+        np.savez(path, counts=self.counts, edges=self.edges)
+
+
+def _gamma_q(a, x):
+    # regularyzowana górna niekompletna funkcja gamma Q(a, x) (szereg / ułamek łańcuchowy)
+    if x <= 0:
+        return 1.0
+    if x < a + 1:
+        term = total = 1.0 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return max(0.0, 1.0 - total * math.exp(-x + a * math.log(x) - math.lgamma(a)))
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 10_000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return math.exp(-x + a * math.log(x) - math.lgamma(a)) * h
+
+
+def _kolmogorov_q(lam):
+    # P(K > lam) dla rozkładu Kołmogorowa
+    if lam < 0.2:
+        return 1.0
+    total = 0.0
+    for j in range(1, 101):
+        term = 2 * (-1) ** (j - 1) * math.exp(-2 * j * j * lam * lam)
+        total += term
+        if abs(term) < 1e-12:
+            break
+    return min(1.0, max(0.0, total))
+
+
+class Distinguisher:
+    """Testy real vs ideal liczone bez wykresów z dwóch StreamingHistogram.
+
+    Statystyki są przeliczane z liczników przy każdym zapytaniu, więc można je
+    sprawdzać po każdej paczce próbek. verdict() mówi, czy wynik jest już
+    rozstrzygnięty:
+      - "distinguishable" - chi-kwadrat albo KS odrzuca równość rozkładów (każdy test
+        na poziomie alpha / 2, razem co najwyżej alpha),
+      - "indistinguishable" - górne ograniczenie (z prawdopodobieństwem 1 - delta)
+        odległości całkowitego wahania jest poniżej tv_epsilon,
+      - None - potrzeba więcej próbek.
+    alpha i delta dotyczą pojedynczego sprawdzenia; run_distinguisher, który
+    sprawdza po każdej paczce, sam dzieli je przez liczbę sprawdzeń.
+    """
+
+    def __init__(self, real_hist, ideal_hist, alpha=0.01, tv_epsilon=0.01, delta=0.01):
+        if (real_hist.low, real_hist.high, real_hist.num_bins) != (ideal_hist.low, ideal_hist.high, ideal_hist.num_bins):
+            raise ValueError("histograms have different binning")
+        self.real = real_hist
+        self.ideal = ideal_hist
+        self.alpha = alpha
+        self.tv_epsilon = tv_epsilon
+        self.delta = delta
+
+    def update(self, real_samples, ideal_samples):
+        self.real.add(real_samples)
+        self.ideal.add(ideal_samples)
+
+    def chi_square(self):
+        """Dwupróbkowy test jednorodności chi-kwadrat -> (statystyka, stopnie swobody, p)"""
+        r = self.real.counts.astype(np.float64)
+        i = self.ideal.counts.astype(np.float64)
+        n_r, n_i = r.sum(), i.sum()
+        if n_r == 0 or n_i == 0:
+            return 0.0, 0, 1.0
+        used = (r + i) > 0
+        r, i = r[used], i[used]
+        stat = float(np.sum((math.sqrt(n_i / n_r) * r - math.sqrt(n_r / n_i) * i) ** 2 / (r + i)))
+        dof = int(used.sum()) - 1
+        if dof <= 0:
+            return stat, dof, 1.0
+        return stat, dof, _gamma_q(dof / 2, stat / 2)
+
+    def ks(self):
+        """Kołmogorow-Smirnow na dystrybuantach z przedziałów -> (D, p)"""
+        n_r, n_i = self.real.total, self.ideal.total
+        if n_r == 0 or n_i == 0:
+            return 0.0, 1.0
+        D = float(np.max(np.abs(np.cumsum(self.real.counts) / n_r - np.cumsum(self.ideal.counts) / n_i)))
+        ne = math.sqrt(n_r * n_i / (n_r + n_i))
+        return D, _kolmogorov_q((ne + 0.12 + 0.11 / ne) * D)
+
+    def total_variation(self):
+        n_r, n_i = self.real.total, self.ideal.total
+        if n_r == 0 or n_i == 0:
+            return 1.0
+        return 0.5 * float(np.sum(np.abs(self.real.counts / n_r - self.ideal.counts / n_i)))
+
+    def tv_upper_bound(self):
+        """TV(real, ideal) <= TV z próbek + błąd estymacji obu histogramów (z pr. 1 - delta)"""
+        k = self.real.num_bins
+        bound = self.total_variation()
+        for n in (self.real.total, self.ideal.total):
+            if n == 0:
+                return 1.0
+            # ||p_hat - p||_1 <= sqrt(2 (k ln 2 + ln(2 / delta)) / n), a TV to połowa L1
+            bound += 0.5 * math.sqrt(2 * (k * math.log(2) + math.log(2 / self.delta)) / n)
+        return min(1.0, bound)
+
+    def verdict(self):
+        if self.chi_square()[2] < self.alpha / 2 or self.ks()[1] < self.alpha / 2:
+            return "distinguishable"
+        if self.tv_upper_bound() <= self.tv_epsilon:
+            return "indistinguishable"
+        return None
+
+    def report(self):
+        stat, dof, p_chi = self.chi_square()
+        D, p_ks = self.ks()
+        return {
+            "samples": (self.real.total, self.ideal.total),
+            "chi2": stat, "chi2_dof": dof, "chi2_p": p_chi,
+            "ks_D": D, "ks_p": p_ks,
+            "tv": self.total_variation(), "tv_upper": self.tv_upper_bound(),
+            "verdict": self.verdict(),
+        }
+
+
+def run_distinguisher(real_batch, ideal_batch, low, high, max_trials, batch_size=100_000,
+                      num_bins=20, alpha=0.01, tv_epsilon=0.01, delta=0.01):
+    """Dokłada paczki z real_batch(size) / ideal_batch(size) aż do rozstrzygnięcia albo max_trials.
+
+    alpha i delta dotyczą całego przebiegu: werdykt jest sprawdzany po każdej
+    paczce, więc każde sprawdzenie dostaje alpha / liczba_paczek i
+    delta / liczba_paczek (poprawka Bonferroniego).
+    Zwraca Distinguisher; liczba wykonanych prób jest w report()["samples"].
+    """
+    num_checks = max(1, -(-max_trials // batch_size))
+    dist = Distinguisher(StreamingHistogram(low, high, num_bins), StreamingHistogram(low, high, num_bins),
+                         alpha=alpha / num_checks, tv_epsilon=tv_epsilon, delta=delta / num_checks)
+    for size in _batches(max_trials, batch_size):
+        dist.update(real_batch(size), ideal_batch(size))
+        if dist.verdict() is not None:
+            break
+    return dist
+
+
+def statistical_test_streamed(real_hist, ideal_hist):
+    """Jak statistical_test, ale rysuje gotowe histogramy zamiast próbek"""
+    ax1 = plt.subplot(1, 1, 1)
+
+    ax1.stairs(real_hist.counts, real_hist.edges, fill=True, alpha=0.7, label='Real World', color='blue')
+    ax1.stairs(ideal_hist.counts, ideal_hist.edges, fill=True, alpha=0.7, label='Ideal World', color='red')
+    ax1.set_title('Distribution Comparison')
+    ax1.set_xlabel('Message Value')
+    ax1.set_ylabel('Frequency')
+    ax1.legend()
+
+    plt.tight_layout()
+    plt.show()
+
+def _batches(num_trials, batch_size):
+    for start in range(0, num_trials, batch_size):
+        yield min(batch_size, num_trials - start)
+
+def experiment_complete_transcripts(num_trials=1000, batch_size=100_000, export_path=None):
     print("Complete Transcripts")
     protocol = SecureSumProtocol(num_nodes=10, N=1000)
 
-    real_transcripts = []
-    ideal_transcripts = []
+    real_hist = StreamingHistogram(0, protocol.N)
+    ideal_hist = StreamingHistogram(0, protocol.N)
 
-    num_trials = 1000
+    for size in _batches(num_trials, batch_size):
+        real_hist.add(protocol.real_world_batch(size))
+        ideal_hist.add(protocol.ideal_world_batch(size))
 
-    for _ in range(num_trials):
-        real_transcript = protocol.real_world_execution()
-        real_transcripts.extend(real_transcript)
+    if export_path:
+        real_hist.export(f"{export_path}_real")
+        ideal_hist.export(f"{export_path}_ideal")
+    statistical_test_streamed(real_hist, ideal_hist)
 
-        ideal_transcript = protocol.ideal_world_simulation()
-        ideal_transcripts.extend(ideal_transcript)
+def experiment_node_views(num_trials=1000, batch_size=100_000, export_path=None):
+    protocol = SecureSumProtocol(num_nodes=10, N=1000)
+
+    node_id = 2
+    real_hist = StreamingHistogram(0, protocol.N)
+    ideal_hist = StreamingHistogram(0, protocol.N)
 
-    statistical_test(real_transcripts, ideal_transcripts)
+    for size in _batches(num_trials, batch_size):
+        real_hist.add(protocol.honest_but_curious_view_batch(node_id, size))
+        ideal_hist.add(protocol.ideal_world_view_batch(size))
 
-def experiment_node_views():
+    if export_path:
+        real_hist.export(f"{export_path}_real")
+        ideal_hist.export(f"{export_path}_ideal")
+    statistical_test_streamed(real_hist, ideal_hist)
+
+def experiment_additive_sharing():
     protocol = SecureSumProtocol(num_nodes=10, N=1000)
 
+    shares, partials = protocol.additive_sharing_execution()
+    assert sum(partials) % protocol.N == sum(protocol.values) % protocol.N
+
     node_id = 2
     real_views = []
     ideal_views = []
@@ -98,15 +387,125 @@ def experiment_node_views():
     num_trials = 1000
 
     for _ in range(num_trials):
-        real_view = protocol.honest_but_curious_view(node_id)
-        real_views.extend([real_view['y_incoming'], real_view['y_outgoing']])
-
-        ideal_view = protocol.ideal_world_view()
-        ideal_views.extend([ideal_view['y_incoming'], ideal_view['y_outgoing']])
+        real_views.extend(protocol.additive_sharing_view(node_id))
+        ideal_views.extend(protocol.ideal_sharing_view())
 
     statistical_test(real_views, ideal_views)
 
+def headless_experiments(max_trials=10**8, batch_size=1_000_000):
+    """Te same porównania co wyżej, ale bez wykresów - tylko testy statystyczne"""
+    protocol = SecureSumProtocol(num_nodes=10, N=1000)
+    node_id = 2
+    experiments = {
+        "complete transcripts": (protocol.real_world_batch, protocol.ideal_world_batch),
+        f"node {node_id} view": (lambda size: protocol.honest_but_curious_view_batch(node_id, size),
+                                 protocol.ideal_world_view_batch),
+    }
+    for name, (real_batch, ideal_batch) in experiments.items():
+        report = run_distinguisher(real_batch, ideal_batch, 0, protocol.N, max_trials, batch_size).report()
+        print(f"{name}: {report}")
+
+# --- przegląd parametrów w wielu procesach ---
+
+def sweep_grid(num_nodes_list, N_list, node_ids, num_trials):
+    """Konfiguracje (num_nodes, N, node_id, trials); node_id=None oznacza pełne transkrypty"""
+    return [(num_nodes, N, node_id, num_trials)
+            for num_nodes, N, node_id in itertools.product(num_nodes_list, N_list, node_ids)
+            if node_id is None or node_id < num_nodes]
+
+
+def _sweep_worker(task):
+    slot, (num_nodes, N, node_id, trials), values, seed_seq, shm_name, shape, num_bins, batch_size = task
+    # wartości są wspólne dla wszystkich fragmentów konfiguracji, a własny
+    # strumień fragmentu losuje tylko R i próbki świata idealnego
+    protocol = SecureSumProtocol(num_nodes=num_nodes, N=N, rng=CounterRNG(seed_seq), values=values)
+
+    real_hist = StreamingHistogram(0, N, num_bins)
+    ideal_hist = StreamingHistogram(0, N, num_bins)
+    for size in _batches(trials, batch_size):
+        if node_id is None:
+            real_hist.add(protocol.real_world_batch(size))
+            ideal_hist.add(protocol.ideal_world_batch(size))
+        else:
+            real_hist.add(protocol.honest_but_curious_view_batch(node_id, size))
+            ideal_hist.add(protocol.ideal_world_view_batch(size))
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.int64, buffer=shm.buf)
+        out[slot, 0] = real_hist.counts
+        out[slot, 1] = ideal_hist.counts
+        del out
+    finally:
+        shm.close()
+    return slot
+
+
+def run_sweep(configs, num_bins=20, processes=None, seed=None, chunk_trials=10**7,
+              batch_size=1_000_000, alpha=0.01, tv_epsilon=0.01, delta=0.01):
+    """Liczy histogramy real/ideal dla każdej konfiguracji w puli procesów.
+
+    Duże liczby prób są dzielone na fragmenty po chunk_trials. Prywatne wartości
+    węzłów są losowane raz na konfigurację i wspólne dla jej fragmentów; każdy
+    fragment dostaje własny strumień z SeedSequence(seed).spawn (R, próbki
+    idealne) i zapisuje liczniki do wspólnej tablicy w pamięci współdzielonej,
+    a rodzic scala fragmenty i zwraca listę (konfiguracja, Distinguisher).
+    """
+    tasks = []
+    for index, (num_nodes, N, node_id, trials) in enumerate(configs):
+        for size in _batches(trials, chunk_trials):
+            tasks.append((index, (num_nodes, N, node_id, size)))
+
+    root = np.random.SeedSequence(seed)
+    # prywatne wartości losowane raz na konfigurację, żeby scalane fragmenty
+    # opisywały tę samą instancję protokołu
+    values = [SecureSumProtocol(num_nodes, N, rng=CounterRNG(seq)).values
+              for (num_nodes, N, _, _), seq in zip(configs, root.spawn(len(configs)))]
+    seeds = root.spawn(len(tasks))
+    shape = (len(tasks), 2, num_bins)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+    try:
+        counts = np.ndarray(shape, dtype=np.int64, buffer=shm.buf)
+        counts[:] = 0
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            work = [(slot, cfg, values[index], seeds[slot], shm.name, shape, num_bins, batch_size)
+                    for slot, (index, cfg) in enumerate(tasks)]
+            for _ in pool.map(_sweep_worker, work):
+                pass
+
+        results = []
+        for index, config in enumerate(configs):
+            N = config[1]
+            dist = Distinguisher(StreamingHistogram(0, N, num_bins), StreamingHistogram(0, N, num_bins),
+                                 alpha=alpha, tv_epsilon=tv_epsilon, delta=delta)
+            for slot, (task_index, _) in enumerate(tasks):
+                if task_index == index:
+                    dist.real.counts += counts[slot, 0]
+                    dist.ideal.counts += counts[slot, 1]
+            results.append((config, dist))
+        del counts
+    finally:
+        shm.close()
+        shm.unlink()
+    return results
+
+
+def experiment_sweep(num_trials=10**6):
+    configs = sweep_grid([3, 10, 30], [100, 1000, 10007], [None, 0, 2], num_trials)
+    for (num_nodes, N, node_id, trials), dist in run_sweep(configs, seed=2024):
+        report = dist.report()
+        view = "transcript" if node_id is None else f"node {node_id}"
+        print(f"n={num_nodes:3d} N={N:6d} {view:10s} trials={trials}: "
+              f"chi2_p={report['chi2_p']:.3g} ks_p={report['ks_p']:.3g} tv={report['tv']:.4f} -> {report['verdict']}")
+
 
 if __name__ == "__main__":
-    experiment_complete_transcripts()
-    experiment_node_views()
+    import sys
+    if "--headless" in sys.argv:
+        headless_experiments()
+    elif "--sweep" in sys.argv:
+        experiment_sweep()
+    else:
+        experiment_complete_transcripts()
+        experiment_node_views()
+        experiment_additive_sharing()
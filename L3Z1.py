@@ -1,7 +1,15 @@
+import copy
 import hashlib
-import secrets
-import random
-from typing import Dict, Set, Tuple
+import math
+import multiprocessing
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Set, Tuple
+import numpy as np
+from rng import CounterRNG, make_rng
 
 def H(data: bytes) -> str:
     return hashlib.sha256(data).hexdigest()
@@ -10,27 +18,169 @@ def commit_color(vertex: int, color_label: int, nonce: bytes, round_id: int) ->
     # hash zawiera vertex_id, kolor, nonce i round_id
     return H(vertex.to_bytes(4, 'big') + color_label.to_bytes(1, 'big') + nonce + round_id.to_bytes(4, 'big'))
 
+def commit_color_digest(vertex: int, color_label: int, nonce: bytes, round_id: int) -> bytes:
+    # to samo co commit_color, ale surowe 32 bajty zamiast hex
+    return hashlib.sha256(vertex.to_bytes(4, 'big') + color_label.to_bytes(1, 'big') + nonce + round_id.to_bytes(4, 'big')).digest()
+
+def commitment_matches(expected, vertex: int, color_label: int, nonce: bytes, round_id: int) -> bool:
+    if isinstance(expected, str):
+        return commit_color(vertex, color_label, nonce, round_id) == expected
+    return commit_color_digest(vertex, color_label, nonce, round_id) == expected
+
+NONCE_LEN = 16
+DIGEST_LEN = 32
+# obraz skrótu z commit_color_digest jako rekord: wierzchołek | kolor | nonce | round_id (25 B)
+PREIMAGE = np.dtype([("vertex", ">u4"), ("color", "u1"), ("nonce", f"V{NONCE_LEN}"), ("round", ">u4")])
+
+class RoundCommitments:
+    """Commitmenty jednej rundy jako ciągły bufor skrótów (32 B na wierzchołek)"""
+    def __init__(self, index: Dict[int,int], digests: bytes):
+        self._index = index
+        self.digests = digests
+
+    def __getitem__(self, vertex: int) -> bytes:
+        i = self._index[vertex] * DIGEST_LEN
+        return self.digests[i:i + DIGEST_LEN]
+
+    def __len__(self):
+        return len(self._index)
+
+class MerkleTree:
+    """Drzewo Merkle nad skrótami jednej rundy; liście dopełnione zerami do potęgi dwójki"""
+    def __init__(self, leaves: bytes):
+        n = len(leaves) // DIGEST_LEN
+        level = leaves + bytes(DIGEST_LEN * ((1 << merkle_depth(n)) - n))
+        self.levels = [level]
+        while len(level) > DIGEST_LEN:
+            parent = bytearray(len(level) // 2)
+            for i in range(0, len(level), 2 * DIGEST_LEN):
+                # prefiks 0x01 odróżnia węzły wewnętrzne od liści
+                parent[i // 2:i // 2 + DIGEST_LEN] = hashlib.sha256(b"\x01" + level[i:i + 2 * DIGEST_LEN]).digest()
+            level = bytes(parent)
+            self.levels.append(level)
+        self.root = level
+
+    def path(self, index: int) -> List[bytes]:
+        # rodzeństwo na kolejnych poziomach, od liścia do korzenia
+        result = []
+        for level in self.levels[:-1]:
+            sibling = (index ^ 1) * DIGEST_LEN
+            result.append(level[sibling:sibling + DIGEST_LEN])
+            index >>= 1
+        return result
+
+def merkle_depth(num_leaves: int) -> int:
+    return max(0, num_leaves - 1).bit_length()
+
+def merkle_verify(root: bytes, leaf: bytes, index: int, path: List[bytes]) -> bool:
+    node = leaf
+    for sibling in path:
+        pair = node + sibling if index & 1 == 0 else sibling + node
+        node = hashlib.sha256(b"\x01" + pair).digest()
+        index >>= 1
+    return index == 0 and node == root
+
 class Prover:
-    def __init__(self, graph: Dict[int, Set[int]], coloring: Dict[int,int]):
+    def __init__(self, graph: Dict[int, Set[int]], coloring: Dict[int,int], rng=None):
         self.graph = graph
         self.coloring = coloring
+        # nonce muszą być nieprzewidywalne, więc domyślnie CSPRNG; do symulacji make_rng("sim", seed)
+        self.rng = rng if rng is not None else make_rng("csprng")
 
     def prepare_round(self, round_id: int) -> Dict[int,str]:
         # losowa permutacja kolorów
         perm = list(range(3))
-        random.shuffle(perm)
+        self.rng.shuffle(perm)
         self._last_perm = perm
         self._last_nonces = {}
         self._last_commitments = {}
+        # rundy z prepare_rounds bez odpowiedzi (np. przerwany przebieg wsadowy)
+        # nie mogą przesłonić tej rundy w respond_challenge
+        self._batched = {}
+        self._merkle = {}
         for v in self.graph:
             color = perm[self.coloring[v]]
-            nonce = secrets.token_bytes(16)
+            nonce = self.rng.randbytes(16)
             self._last_nonces[v] = nonce
             self._last_commitments[v] = commit_color(v, color, nonce, round_id)
         return self._last_commitments
 
-    def respond_challenge(self, edge: Tuple[int,int]) -> Dict[int, Tuple[int, bytes]]:
+    def _vertex_index(self):
+        # kolejność wierzchołków w buforach wsadowych, liczona raz na graf
+        if getattr(self, "_index_graph", None) is not self.graph:
+            # posortowane, żeby kolejność skrótów była ustalona także dla weryfikatora (dowód nieinteraktywny)
+            self._vertices = sorted(self.graph)
+            self._index = {v: i for i, v in enumerate(self._vertices)}
+            self._vertex_ids = np.array(self._vertices, dtype=PREIMAGE["vertex"])
+            self._index_graph = self.graph
+        return self._vertices, self._index, self._vertex_ids
+
+    def prepare_rounds(self, first_round_id: int, k: int):
+        """Commitmenty dla rund first_round_id .. first_round_id + k - 1 naraz.
+
+        Wszystkie nonce są losowane jednym wywołaniem. Obrazy skrótów całej
+        rundy powstają naraz w tablicy rekordów PREIMAGE, a w pętli zostaje
+        tylko sha256 na kolejnych wycinkach jej bufora. Zwraca listę
+        RoundCommitments; odpowiedź dla danej rundy: respond_challenge(edge, round_id).
+        """
+        vertices, index, vertex_ids = self._vertex_index()
+        nv = len(vertices)
+        nonces = memoryview(self.rng.randbytes(NONCE_LEN * nv * k))
+        sha256 = hashlib.sha256
+        # nowa partia zastępuje rundy poprzedniej, na które nie było już odpowiedzi
+        self._batched = {}
+        self._merkle = {}
+
+        labels = np.fromiter((self.coloring[v] for v in vertices), dtype=np.uint8, count=nv)
+        records = np.empty(nv, dtype=PREIMAGE)
+        records["vertex"] = vertex_ids
+        raw = memoryview(records.view(np.uint8))
+        size = PREIMAGE.itemsize
+        offsets = range(0, size * nv, size)
+        result = []
+        for j in range(k):
+            round_id = first_round_id + j
+            perm = list(range(3))
+            self.rng.shuffle(perm)
+            round_nonces = nonces[NONCE_LEN * nv * j:NONCE_LEN * nv * (j + 1)]
+            records["color"] = np.array(perm, dtype=np.uint8)[labels]
+            records["nonce"] = np.frombuffer(round_nonces, dtype=PREIMAGE["nonce"])
+            records["round"] = round_id
+            digests = b"".join([sha256(raw[o:o + size]).digest() for o in offsets])
+            self._batched[round_id] = (perm, round_nonces)
+            result.append(RoundCommitments(index, digests))
+        return result
+
+    def prepare_rounds_merkle(self, first_round_id: int, k: int) -> List[bytes]:
+        """Jak prepare_rounds, ale weryfikator dostaje tylko korzeń Merkle każdej rundy.
+
+        respond_challenge(edge, round_id) dla takiej rundy zwraca otwarcia
+        (kolor, nonce, ścieżka uwierzytelniająca).
+        """
+        roots = []
+        for j, commitments in enumerate(self.prepare_rounds(first_round_id, k)):
+            tree = MerkleTree(commitments.digests)
+            self._merkle[first_round_id + j] = tree
+            roots.append(tree.root)
+        return roots
+
+    def respond_challenge(self, edge: Tuple[int,int], round_id: int = None) -> Dict[int, Tuple[int, bytes]]:
         u, v = edge
+        if round_id is not None and round_id in getattr(self, "_batched", {}):
+            # runda z prepare_rounds - jedna odpowiedź na rundę, potem zwalniamy jej stan
+            perm, round_nonces = self._batched.pop(round_id)
+            index = self._index
+            nonce = lambda x: bytes(round_nonces[NONCE_LEN * index[x]:NONCE_LEN * (index[x] + 1)])
+            tree = getattr(self, "_merkle", {}).pop(round_id, None)
+            if tree is not None:
+                return {
+                    u: (perm[self.coloring[u]], nonce(u), tree.path(index[u])),
+                    v: (perm[self.coloring[v]], nonce(v), tree.path(index[v]))
+                }
+            return {
+                u: (perm[self.coloring[u]], nonce(u)),
+                v: (perm[self.coloring[v]], nonce(v))
+            }
         perm = self._last_perm
         return {
             u: (perm[self.coloring[u]], self._last_nonces[u]),
@@ -38,42 +188,99 @@ class Prover:
         }
 
 class Verifier:
-    def __init__(self, graph: Dict[int, Set[int]]):
+    def __init__(self, graph: Dict[int, Set[int]], rng=None):
         self.graph = graph
+        self.rng = rng if rng is not None else make_rng("csprng")
+        # indeks krawędzi budowany raz: i-ta krawędź to (_edge_u[i], _edge_v[i]), u < v
+        self._edge_u = array('I')
+        self._edge_v = array('I')
+        for u in graph:
+            for v in graph[u]:
+                if u < v:
+                    self._edge_u.append(u)
+                    self._edge_v.append(v)
+        self.num_edges = len(self._edge_u)
+        self._leaf_index = None  # pozycje liści Merkle, liczone przy pierwszej rundzie z korzeniem
 
     def choose_edge(self) -> Tuple[int,int]:
-        edges = [(u, v) for u in self.graph for v in self.graph[u] if u < v]
-        return random.choice(edges)
+        i = self.rng.randrange(self.num_edges)
+        return self._edge_u[i], self._edge_v[i]
+
+    def choose_edges(self, k: int) -> List[Tuple[int,int]]:
+        # k wyzwań naraz (dla rund przygotowanych przez prepare_rounds)
+        randrange, m, eu, ev = self.rng.randrange, self.num_edges, self._edge_u, self._edge_v
+        result = []
+        for _ in range(k):
+            i = randrange(m)
+            result.append((eu[i], ev[i]))
+        return result
 
     def check_openings(self, commitments: Dict[int,str], round_id: int, openings: Dict[int, Tuple[int, bytes]]) -> bool:
+        # bez wypisywania - powód odrzucenia zostaje w self.failure
+        self.failure = None
         keys = list(openings.keys())
         if len(keys) != 2:
+            self.failure = "Zła liczba otwarć"
             return False
         u, v = keys
+        if isinstance(commitments, bytes):
+            # tryb Merkle: commitments to korzeń, otwarcia mają ścieżki uwierzytelniające
+            return self._check_merkle_openings(commitments, round_id, u, v, openings)
         pu, nonce_u = openings[u]
         pv, nonce_v = openings[v]
-        print(f"Sprawdzanie krawędzi ({u}, {v}) z kolorami {pu}, {pv}")
-        if commit_color(u, pu, nonce_u, round_id) != commitments[u]:
-            print("Hash mismatch u")
+        if not commitment_matches(commitments[u], u, pu, nonce_u, round_id):
+            self.failure = "Hash mismatch u"
             return False
-        if commit_color(v, pv, nonce_v, round_id) != commitments[v]:
-            print("Hash mismatch v")
+        if not commitment_matches(commitments[v], v, pv, nonce_v, round_id):
+            self.failure = "Hash mismatch v"
             return False
         if pu == pv:
-            print("Kolory dla krawędzi takie same!")
+            self.failure = "Kolory dla krawędzi takie same!"
             return False
         return True
 
-def run_protocol(graph: Dict[int, Set[int]], prover: Prover, rounds: int):
-    verifier = Verifier(graph)
+    def _check_merkle_openings(self, root: bytes, round_id: int, u: int, v: int, openings) -> bool:
+        if self._leaf_index is None:
+            self._leaf_index = {x: i for i, x in enumerate(sorted(self.graph))}
+            self._merkle_depth = merkle_depth(len(self._leaf_index))
+        colors = []
+        for x in (u, v):
+            color, nonce, path = openings[x]
+            if len(path) != self._merkle_depth:
+                self.failure = "Zła długość ścieżki Merkle"
+                return False
+            if not merkle_verify(root, commit_color_digest(x, color, nonce, round_id), self._leaf_index[x], path):
+                self.failure = "Hash mismatch " + ("u" if x == u else "v")
+                return False
+            colors.append(color)
+        if colors[0] == colors[1]:
+            self.failure = "Kolory dla krawędzi takie same!"
+            return False
+        return True
+
+def run_protocol(graph: Dict[int, Set[int]], prover: Prover, rounds: int, rng=None, batch: int = 0,
+                 merkle: bool = False):
+    # batch > 0 - commitmenty przygotowywane po batch rund naraz (prepare_rounds)
+    # merkle - weryfikator dostaje w rundzie tylko korzeń (prepare_rounds_merkle)
+    verifier = Verifier(graph, rng)
     accepted = True
+    prepared = []
+    if merkle:
+        batch = batch or 1
     for r in range(1, rounds+1):
-        commitments = prover.prepare_round(r)
+        if batch:
+            if not prepared:
+                prepare = prover.prepare_rounds_merkle if merkle else prover.prepare_rounds
+                prepared = prepare(r, min(batch, rounds - r + 1))
+            commitments = prepared.pop(0)
+        else:
+            commitments = prover.prepare_round(r)
         edge = verifier.choose_edge()
-        openings = prover.respond_challenge(edge)
+        openings = prover.respond_challenge(edge, r)
         ok = verifier.check_openings(commitments, r, openings)
         print(f"Runda {r}, edge {edge}: {'PASS' if ok else 'FAIL'}")
         if not ok:
+            print(verifier.failure)
             accepted = False
             break
     if accepted:
@@ -81,23 +288,242 @@ def run_protocol(graph: Dict[int, Set[int]], prover: Prover, rounds: int):
     else:
         print("Oszustwo")
 
+# Rundy są niezależne po zrobieniu commitmentów, więc run_protocol_parallel
+# dzieli je na fragmenty po chunk rund liczone w osobnych procesach. Każdy
+# proces dostaje raz (initializer) graf i kopię podanego dowodzącego - z jego
+# klasą, więc np. Cheater albo inna podklasa Prover liczy rundy tak jak
+# w run_protocol. Fragment to tylko (pierwsza runda, liczba rund, ziarno),
+# a generator dowodzącego jest podmieniany na strumień danego fragmentu.
+# Wspólne zdarzenie stop przerywa pozostałe procesy po pierwszym FAIL.
+
+_worker_graph = None
+_worker_prover = None
+_worker_stop = None
+
+def _init_worker(graph, prover, stop):
+    global _worker_graph, _worker_prover, _worker_stop
+    _worker_graph, _worker_prover, _worker_stop = graph, prover, stop
+
+def _portable_prover(prover: Prover) -> Prover:
+    # płytka kopia do procesów roboczych: bez generatora (SystemRandom nie daje się
+    # serializować, a każdy fragment i tak dostaje własny) i bez stanu rund wsadowych
+    clone = copy.copy(prover)
+    clone.rng = None
+    clone._batched = {}
+    clone._merkle = {}
+    return clone
+
+def _rounds_worker(task):
+    first_round, count, seed_seq = task
+    if seed_seq is None:
+        prover_rng, verifier_rng = make_rng("csprng"), make_rng("csprng")
+    else:
+        prover_rng, verifier_rng = CounterRNG(seed_seq).spawn(2)
+    prover = _worker_prover
+    prover.rng = prover_rng
+    verifier = Verifier(_worker_graph, verifier_rng)
+    results = []
+    r = first_round
+    end = first_round + count
+    while r < end and not _worker_stop.is_set():
+        # przygotowanie po kilka rund, żeby często sprawdzać stop
+        k = min(16, end - r)
+        commitments = prover.prepare_rounds(r, k)
+        for j, edge in enumerate(verifier.choose_edges(k)):
+            openings = prover.respond_challenge(edge, r + j)
+            ok = verifier.check_openings(commitments[j], r + j, openings)
+            results.append((r + j, edge, ok))
+            if not ok:
+                _worker_stop.set()
+                return results
+        r += k
+    return results
+
+def iter_rounds_parallel(graph: Dict[int, Set[int]], prover: Prover, rounds: int,
+                         processes: int = None, chunk: int = 64, seed=None):
+    """Rundy 1..rounds w puli procesów; zwraca (runda, krawędź, ok) w kolejności ukończenia fragmentów.
+
+    Procesy liczą na kopiach prover (ta sama klasa i atrybuty, własne generatory).
+    Po pierwszym FAIL pozostałe fragmenty są anulowane. seed=None - CSPRNG
+    w każdym procesie, w przeciwnym razie powtarzalne strumienie z SeedSequence(seed).spawn.
+    """
+    starts = list(range(1, rounds + 1, chunk))
+    seeds = np.random.SeedSequence(seed).spawn(len(starts)) if seed is not None else [None] * len(starts)
+    stop = multiprocessing.Event()
+    pool = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                               initargs=(graph, _portable_prover(prover), stop))
+    try:
+        futures = [pool.submit(_rounds_worker, (start, min(chunk, rounds - start + 1), seeds[i]))
+                   for i, start in enumerate(starts)]
+        for future in as_completed(futures):
+            results = future.result()
+            yield from results
+            if results and not results[-1][2]:
+                break
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def run_protocol_parallel(graph: Dict[int, Set[int]], prover: Prover, rounds: int,
+                          processes: int = None, chunk: int = 64, seed=None, verbose: bool = False):
+    start = time.perf_counter()
+    done = 0
+    failed = None
+    for r, edge, ok in iter_rounds_parallel(graph, prover, rounds, processes, chunk, seed):
+        done += 1
+        if verbose or not ok:
+            print(f"Runda {r}, edge {edge}: {'PASS' if ok else 'FAIL'}")
+        if not ok:
+            failed = r
+    elapsed = time.perf_counter() - start
+    print(f"{done} rund w {elapsed:.2f} s ({done / elapsed:.0f} rund/s)")
+    if failed is None:
+        print(f"Sukces po {rounds} rundach")
+    else:
+        print("Oszustwo")
+    return failed is None
+
 
 class Cheater(Prover):
-    def __init__(self, graph: Dict[int, Set[int]]):
-        # losowe kolorowanie
-        fake_coloring = {v: random.randint(0,2) for v in graph}
+    def __init__(self, graph: Dict[int, Set[int]], rng=None):
         self.graph = graph
+        self.rng = rng if rng is not None else make_rng("csprng")
+        # losowe kolorowanie
+        fake_coloring = {v: self.rng.randint(0,2) for v in graph}
         self.coloring = fake_coloring
 
+# Wariant nieinteraktywny (Fiat-Shamir): wszystkie rundy są commitowane naraz,
+# a wyzwanie rundy j to krawędź nr SHA256(h || j) mod |E|, gdzie h to skrót
+# grafu, liczby rund i wszystkich commitmentów. Dowód w bajtach:
+#
+#   nagłówek  NI_HEADER: magic, |V|, liczba rund
+#   skróty    rounds * |V| * 32 B, wierzchołki w kolejności rosnącej
+#   otwarcia  rounds * NI_OPENING: (u, kolor u, nonce u, v, kolor v, nonce v)
+
+# Oszust może przeliczać dowód offline dowolnie wiele razy, więc liczbę rund
+# ustala weryfikator: tyle, żeby (1 - 1/|E|)^rounds <= 2^-security_bits.
+NI_SECURITY_BITS = 80
+
+NI_MAGIC = b"3COL"
+NI_HEADER = struct.Struct("!4sII")
+NI_OPENING = struct.Struct("!IB16sIB16s")
+
+def _graph_digest(edges: List[Tuple[int,int]]) -> bytes:
+    flat = array('I', [x for edge in edges for x in edge])
+    if sys.byteorder == "little":
+        flat.byteswap()
+    return hashlib.sha256(flat.tobytes()).digest()
+
+def _fs_edges(graph_digest: bytes, rounds: int, digests, edges: List[Tuple[int,int]]) -> List[Tuple[int,int]]:
+    h = hashlib.sha256(NI_MAGIC + graph_digest + rounds.to_bytes(4, 'big'))
+    h.update(digests)
+    h = h.digest()
+    m = len(edges)
+    return [edges[int.from_bytes(hashlib.sha256(h + j.to_bytes(4, 'big')).digest(), 'big') % m]
+            for j in range(1, rounds + 1)]
+
+def _sorted_edges(graph: Dict[int, Set[int]]) -> List[Tuple[int,int]]:
+    return sorted((u, v) for u in graph for v in graph[u] if u < v)
+
+def ni_rounds(num_edges: int, security_bits: int = NI_SECURITY_BITS) -> int:
+    """Liczba rund dowodu nieinteraktywnego dla danego poziomu bezpieczeństwa"""
+    if num_edges <= 1:
+        return 1
+    return math.ceil(security_bits / -math.log2(1 - 1 / num_edges))
+
+def prove_noninteractive(prover: Prover, rounds: int = None) -> bytes:
+    """Dowód nieinteraktywny jako jeden obiekt bajtowy; domyślnie ni_rounds(|E|) rund"""
+    edges = _sorted_edges(prover.graph)
+    if rounds is None:
+        rounds = ni_rounds(len(edges))
+    prepared = prover.prepare_rounds(1, rounds)
+    digests = b"".join(c.digests for c in prepared)
+    parts = [NI_HEADER.pack(NI_MAGIC, len(prover.graph), rounds), digests]
+    for j, (u, v) in enumerate(_fs_edges(_graph_digest(edges), rounds, digests, edges), 1):
+        openings = prover.respond_challenge((u, v), j)
+        parts.append(NI_OPENING.pack(u, openings[u][0], openings[u][1], v, openings[v][0], openings[v][1]))
+    return b"".join(parts)
+
+class NIVerifier:
+    """Weryfikacja dowodów nieinteraktywnych offline; indeks grafu liczony raz dla wielu dowodów.
+
+    Liczba rund jest ustalana tutaj (domyślnie ni_rounds(|E|)), a dowód
+    z inną liczbą rund w nagłówku jest odrzucany.
+    """
+    def __init__(self, graph: Dict[int, Set[int]], rounds: int = None):
+        self.graph = graph
+        self.edges = _sorted_edges(graph)
+        self.rounds = rounds if rounds is not None else ni_rounds(len(self.edges))
+        self.graph_digest = _graph_digest(self.edges)
+        self.index = {v: i for i, v in enumerate(sorted(graph))}
+        self.failure = None
+
+    def verify(self, proof: bytes) -> bool:
+        self.failure = None
+        view = memoryview(proof)
+        try:
+            magic, nv, rounds = NI_HEADER.unpack_from(view)
+        except struct.error:
+            self.failure = "Za krótki dowód"
+            return False
+        if magic != NI_MAGIC or nv != len(self.index):
+            self.failure = "Zły nagłówek dowodu"
+            return False
+        if rounds != self.rounds:
+            self.failure = f"Zła liczba rund: {rounds}, wymagane {self.rounds}"
+            return False
+        block = nv * DIGEST_LEN
+        start = NI_HEADER.size
+        openings_start = start + rounds * block
+        if len(view) != openings_start + rounds * NI_OPENING.size:
+            self.failure = "Zła długość dowodu"
+            return False
+        digests = view[start:openings_start]
+        challenges = _fs_edges(self.graph_digest, rounds, digests, self.edges)
+        for j in range(rounds):
+            u, pu, nonce_u, v, pv, nonce_v = NI_OPENING.unpack_from(view, openings_start + j * NI_OPENING.size)
+            if (u, v) != challenges[j]:
+                self.failure = f"Runda {j + 1}: otwarto złą krawędź"
+                return False
+            # przeliczane są tylko dwa otwarte commitmenty rundy
+            base = j * block
+            for x, px, nonce in ((u, pu, nonce_u), (v, pv, nonce_v)):
+                i = base + self.index[x] * DIGEST_LEN
+                if commit_color_digest(x, px, nonce, j + 1) != digests[i:i + DIGEST_LEN]:
+                    self.failure = f"Runda {j + 1}: hash mismatch"
+                    return False
+            if pu == pv or pu > 2 or pv > 2:
+                self.failure = f"Runda {j + 1}: kolory dla krawędzi takie same!"
+                return False
+        return True
+
+    def verify_batch(self, proofs: List[bytes]) -> List[bool]:
+        return [self.verify(proof) for proof in proofs]
+
+
 if __name__ == "__main__":
     graph = {0:{1,5}, 1:{0,2,5}, 2:{1,5}, 3:{4,5}, 4:{3,5}, 5:{0,1,2,3,4}}
     rounds = 100  # np. 10*|E|
+    # --parallel - rundy w puli procesów (run_protocol_parallel)
+    run = run_protocol_parallel if "--parallel" in sys.argv else run_protocol
 
     coloring = {0:0, 1:1, 2:0, 3:0, 4:1, 5:2}
     prover = Prover(graph, coloring)
+    if "--ni" in sys.argv:
+        # dowody nieinteraktywne, weryfikowane offline jednym NIVerifier
+        verifier = NIVerifier(graph)
+        proofs = [prove_noninteractive(prover), prove_noninteractive(Cheater(graph))]
+        print(f"Rund: {verifier.rounds}, rozmiar dowodu: {len(proofs[0])} B")
+        print("Uczciwy, oszust:", verifier.verify_batch(proofs))
+        # krótki dowód oszusta, przeliczany aż przejdzie własne wyzwania, i tak jest odrzucany
+        short = prove_noninteractive(Cheater(graph), 1)
+        while not NIVerifier(graph, 1).verify(short):
+            short = prove_noninteractive(Cheater(graph), 1)
+        print("Oszust z 1 rundą:", verifier.verify(short), "-", verifier.failure)
+        sys.exit(0)
     print("Symulacja uczciwego:")
-    run_protocol(graph, prover, rounds)
+    run(graph, prover, rounds)
 
     cheater = Cheater(graph)
     print("\nSymulacja oszusta:")
-    run_protocol(graph, cheater, rounds)
+    run(graph, cheater, rounds)
@@ -1,16 +1,20 @@
 import math
-import random
-from sympy import randprime
 import hashlib
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from keygen import prime_pair
+from rng import make_rng
 
 
 def egcd(a, b):
-    # Extended Euclidean Algorithm
-    if a == 0:
-        return (b, 0, 1)
-    else:
-        g, y, x = egcd(b % a, a)
-        return (g, x - (b // a) * y, y)
+    # Extended Euclidean Algorithm (iterative, returns g, x, y with a*x + b*y = g)
+    x0, y0, x1, y1 = 1, 0, 0, 1
+    while b:
+        q, a, b = a // b, b, a % b
+        x0, x1 = x1, x0 - q * x1
+        y0, y1 = y1, y0 - q * y1
+    return a, x0, y0
 
 
 def modinv(a, m):
@@ -22,27 +26,69 @@ def modinv(a, m):
         return x % m
 
 
-def randomZnElement(N):
+class ModArith:
+    # Shared modular arithmetic for the FSI classes: every exponentiation is a
+    # three-argument pow, and with the factors p, q known it goes through CRT
+    # (two half-size exponentiations with exponents reduced mod p-1, q-1).
+
+    def __init__(self, n, p=None, q=None):
+        self.n = n
+        # CRT needs distinct factors; otherwise plain pow mod n
+        if p is None or q is None or p == q:
+            p = q = None
+        self.p = p
+        self.q = q
+        if p is not None:
+            self.q_inv = modinv(q, p)
+
+    def pow(self, base, e):
+        if self.p is None or e < 0:
+            return pow(base, e, self.n)
+        p, q = self.p, self.q
+        bp, bq = base % p, base % q
+        # exponent reduction (Fermat) only holds for bases coprime to the factor
+        mp = pow(bp, e % (p - 1), p) if bp else pow(bp, e, p)
+        mq = pow(bq, e % (q - 1), q) if bq else pow(bq, e, q)
+        return self.crt(mp, mq)
+
+    def crt(self, mp, mq):
+        # x mod n from x mod p and x mod q (Garner)
+        return mq + self.q * ((mp - mq) * self.q_inv % self.p)
+
+    def sqr(self, a):
+        return a * a % self.n
+
+    def mul(self, a, b):
+        return a * b % self.n
+
+    def inv(self, a):
+        return modinv(a, self.n)
+
+
+def randomZnElement(N, rng=None):
     # Returns a random element in Z_N^*
+    rng = rng if rng is not None else make_rng("csprng")
     g = N
     while math.gcd(g, N) != 1:
-        g = random.randint(2, N)
+        g = rng.randint(2, N)
     return g
 
 
-def GenModulus(w):
+def GenModulus(w, rng=None):
     # Generates RSA modulus N of bit-length w
+    # primes come from the keygen pool when one is filled (python3 keygen.py ...),
+    # otherwise from the Miller-Rabin generator; with an injected rng the pool
+    # is skipped so the primes are reproducible for a given seed
     n = len(w) // 2
-    p = randprime(2 ** n, 2 ** (n + 1))
-    q = randprime(2 ** n, 2 ** (n + 1))
+    p, q = prime_pair(n, rng)
     N = p * q
     return N, p, q
 
 
-def GenRSA(w):
+def GenRSA(w, rng=None):
     # Generates RSA keys of bit-length w
     n = len(w)
-    N, p, q = GenModulus(w)
+    N, p, q = GenModulus(w, rng)
     m = (p - 1) * (q - 1)
     e = 2 ** 16 + 1
     d = modinv(e, m)
@@ -51,15 +97,17 @@ def GenRSA(w):
 
 def check(n, x, a, e, b):
     # Static method to check the verification step
-    left = (b ** 2) % n
-    right = (a * (x ** e)) % n
+    left = pow(b, 2, n)
+    right = a * pow(x, e, n) % n
     return left == right
 
 
 class FSI_Prover:
     # Fiat-Shamir Identification Prover
-    def __init__(self, w):
+    def __init__(self, w, rng=None):
         self.w = w
+        # source of randomness (random.Random API), CSPRNG unless a simulation rng is injected
+        self.rng = rng if rng is not None else make_rng("csprng")
         self.GenFSI(w)
         self.r = None
         self.a = None
@@ -70,29 +118,43 @@ class FSI_Prover:
 
     def GenFSI(self, w):
         # Generates keys for Fiat-Shamir Identification
-        self.n, _, _, p, q = GenRSA(self.w)
-        self.y = randomZnElement(self.n)  # secret key
-        self.x = (self.y ** 2) % self.n  # public key
+        self.n, _, _, p, q = GenRSA(self.w, self.rng)
+        # the prover keeps the factors, so its exponentiations can use CRT
+        self.arith = ModArith(self.n, p, q)
+        self.y = randomZnElement(self.n, self.rng)  # secret key
+        self.x = self.arith.sqr(self.y)  # public key
 
     def FSI_Prover_Step_1_Commit(self):
         # Prover's first step in Fiat-Shamir Identification
-        self.r = randomZnElement(self.n)
-        a = (self.r ** 2) % self.n
+        self.r = randomZnElement(self.n, self.rng)
+        a = self.arith.sqr(self.r)
         return a
 
     def FSI_Prover_Step_2_Response(self, e):
         # Prover's second step in Fiat-Shamir Identification
-        b = (self.r * (self.y ** e)) % self.n
+        b = self.arith.mul(self.r, self.arith.pow(self.y, e))
         return b
 
+    def FSI_Prover_Commit_Batch(self, t):
+        # Parallel repetition: t independent commitments sent at once
+        self.rs = [randomZnElement(self.n, self.rng) for _ in range(t)]
+        return [self.arith.sqr(r) for r in self.rs]
+
+    def FSI_Prover_Response_Batch(self, e_bits):
+        # e_bits: t-bit challenge vector, bit i answers commitment i (b_i = r_i * y^e_i)
+        y, mul = self.y, self.arith.mul
+        return [mul(r, y) if (e_bits >> i) & 1 else r for i, r in enumerate(self.rs)]
+
 
 class FSI_Verifier:
     # Fiat-Shamir Identification Verifier
 
-    def __init__(self, n, x):
+    def __init__(self, n, x, rng=None):
         # Initializes the verifier with public key (n, x)
         self.n = n
         self.x = x
+        self.arith = ModArith(n)
+        self.rng = rng if rng is not None else make_rng("csprng")
         self.e = None
         self.a = None
         self.b = None
@@ -100,34 +162,51 @@ class FSI_Verifier:
     def FSI_Verifier_Step_1_Challenge(self, a):
         # Verifier's challenge in Fiat-Shamir Identification
         self.a = a
-        e = random.randint(0, 1)
+        e = self.rng.randint(0, 1)
         self.e = e
         return e
 
     def FSI_Verifier_Step_2_Verify(self, b):
         # Verifier's second step in Fiat-Shamir Identification
-        left = (b ** 2) % self.n
-        right = (self.a * (self.x ** self.e)) % self.n
+        left = self.arith.sqr(b)
+        right = self.arith.mul(self.a, self.arith.pow(self.x, self.e))
         return left == right
 
+    def FSI_Verifier_Challenge_Batch(self, a_list):
+        # t-bit challenge vector for t parallel commitments
+        self.a_list = a_list
+        self.e_bits = self.rng.getrandbits(len(a_list))
+        return self.e_bits
+
+    def FSI_Verifier_Verify_Batch(self, b_list):
+        # Checks all t responses in one pass: with 1-bit challenges x^e_i is
+        # 1 or x, so each check is a squaring and at most one multiplication
+        # (a random-weight batch equation would only add exponentiations here)
+        n, x, e_bits = self.n, self.x, self.e_bits
+        if len(b_list) != len(self.a_list):
+            return [False] * len(self.a_list)
+        return [0 < b < n and b * b % n == (a * x % n if (e_bits >> i) & 1 else a)
+                for i, (a, b) in enumerate(zip(self.a_list, b_list))]
+
 
 class FSI:
     # Fiat-Shamir Identification Protocol
 
-    def __init__(self, w, rounds=4):
+    def __init__(self, w, rounds=4, rng=None):
         # Initializes the protocol with bit-length w and number of rounds
         self.w = w
         self.rounds = rounds
+        self.rng = rng
 
     def run(self):
         # Runs the Fiat-Shamir Identification protocol
 
-        self.prover = FSI_Prover(self.w)
+        self.prover = FSI_Prover(self.w, self.rng)
 
         n, x = self.prover.get_public_key()
         print(f"Public key (n, x): ({n}, {x})\n")
 
-        self.verifier = FSI_Verifier(n, x)
+        self.verifier = FSI_Verifier(n, x, self.rng)
 
         fsi = {"public_key": (n, x), "rounds": self.rounds, "transcript": []}
         transcript = []
@@ -164,9 +243,11 @@ class FSI:
 class FSI_DishonestProver:
     # Fiat-Shamir Identification Dishonest Prover
 
-    def __init__(self, n, x):
+    def __init__(self, n, x, rng=None):
         self.n = n
         self.x = x
+        self.arith = ModArith(n)
+        self.rng = rng if rng is not None else make_rng("csprng")
         self.r = None
         self.a = None
         self.b = None
@@ -177,17 +258,29 @@ class FSI_DishonestProver:
     def FSI_Prover_Step_1_Commit(self):
         # Prover's first step in Fiat-Shamir Identification
         # r is generated as in the honest prover
-        self.r = randomZnElement(self.n)
+        self.r = randomZnElement(self.n, self.rng)
 
         # P* tries to guess e in advance
-        e = random.randint(0, 1)
+        e = self.rng.randint(0, 1)
 
         if e == 0:
-            a = (self.r ** 2) % self.n
+            a = self.arith.sqr(self.r)
         else:
-            a = (self.r ** 2 * modinv(self.x, self.n)) % self.n
+            a = self.arith.mul(self.arith.sqr(self.r), self.arith.inv(self.x))
         return a
 
+    def FSI_Prover_Commit_Batch(self, t):
+        # t commitments, each prepared for an independently guessed challenge bit
+        commitments = []
+        self.rs = []
+        for _ in range(t):
+            commitments.append(self.FSI_Prover_Step_1_Commit())
+            self.rs.append(self.r)
+        return commitments
+
+    def FSI_Prover_Response_Batch(self, e_bits):
+        return list(self.rs)
+
     def FSI_Prover_Step_2_Response(self, e):
         # Dishonest Prover's second step in Fiat-Shamir Identification
 
@@ -202,22 +295,23 @@ class FSI_DishonestProver:
 class FSI_with_DishonestProver:
     # Fiat-Shamir Identification Protocol
 
-    def __init__(self, w, rounds=20):
+    def __init__(self, w, rounds=20, rng=None):
         # Initializes the protocol with bit-length w and number of rounds
         self.w = w
         self.rounds = rounds
+        self.rng = rng
 
     def run(self):
         # Runs the Fiat-Shamir Identification protocol
 
-        self.honest_prover = FSI_Prover(self.w)
+        self.honest_prover = FSI_Prover(self.w, self.rng)
 
         n, x = self.honest_prover.get_public_key()
         print(f"Public key (n, x): ({n}, {x})\n")
 
-        self.prover = FSI_DishonestProver(n, x)
+        self.prover = FSI_DishonestProver(n, x, self.rng)
 
-        self.verifier = FSI_Verifier(n, x)
+        self.verifier = FSI_Verifier(n, x, self.rng)
 
         fsi = {"public_key": (n, x), "rounds": self.rounds, "transcript": []}
         transcript = []
@@ -251,37 +345,252 @@ class FSI_with_DishonestProver:
         return True
 
 
+class FSI_Parallel:
+    # Fiat-Shamir Identification with t parallel repetitions in one round trip:
+    # t commitments, one t-bit challenge vector, t responses checked in batch.
+    # Soundness 2^-t; the transcript keeps the per-round {"a", "e", "b", "v"} format.
+
+    def __init__(self, w, t=80, rng=None, dishonest=False):
+        self.w = w
+        self.t = t
+        self.rng = rng
+        self.dishonest = dishonest
+
+    def run(self):
+        self.honest_prover = FSI_Prover(self.w, self.rng)
+        n, x = self.honest_prover.get_public_key()
+        print(f"Public key (n, x): ({n}, {x})\n")
+        self.prover = FSI_DishonestProver(n, x, self.rng) if self.dishonest else self.honest_prover
+        self.verifier = FSI_Verifier(n, x, self.rng)
+
+        a_list = self.prover.FSI_Prover_Commit_Batch(self.t)
+        e_bits = self.verifier.FSI_Verifier_Challenge_Batch(a_list)
+        b_list = self.prover.FSI_Prover_Response_Batch(e_bits)
+        results = self.verifier.FSI_Verifier_Verify_Batch(b_list)
+
+        transcript = [{"a": a, "e": (e_bits >> i) & 1, "b": b, "v": v}
+                      for i, (a, b, v) in enumerate(zip(a_list, b_list, results))]
+        fsi = {"public_key": (n, x), "rounds": self.t, "transcript": transcript}
+        accepted = all(results)
+        print(f"{results.count(True)}/{self.t} parallel rounds verified: "
+              f"{'Verification successful!' if accepted else 'Verification failed!'}")
+        self.fsi = fsi
+        return accepted
+
+
 # ==================== NIZKP ====================
 
+class FixedBaseTable:
+    # Fixed-base window table for base^e mod m with e < 2^exponent_bits:
+    # rows[i][d] = base^(d * 2^(window*i)), so base^e is one multiplication
+    # per window-sized digit of e instead of a full square-and-multiply.
+
+    def __init__(self, base, m, window=8, exponent_bits=256):
+        self.m = m
+        self.window = window
+        self.mask = (1 << window) - 1
+        self.rows = []
+        row_base = base % m
+        for _ in range((exponent_bits + window - 1) // window):
+            row = [1]
+            for _ in range(self.mask):
+                row.append(row[-1] * row_base % m)
+            self.rows.append(row)
+            row_base = row[-1] * row_base % m  # base^(2^window) of this row
+        self.max_exponent = 1 << (window * len(self.rows))
+
+    def pow(self, e):
+        if not 0 <= e < self.max_exponent:
+            return None
+        result = 1
+        m, mask, window = self.m, self.mask, self.window
+        for row in self.rows:
+            digit = e & mask
+            if digit:
+                result = result * row[digit] % m
+            e >>= window
+        return result
+
+
+class SigningPrecomputation:
+    # Offline part of signing with one long-lived key: a background thread keeps
+    # a pool of (r, r^2 mod n) commitments filled and sk^e comes from fixed-base
+    # tables (mod p and mod q when the factors are known, combined with CRT).
+    # The thread shares the GIL, so it helps bursty signing by using idle time
+    # rather than adding throughput.
+
+    def __init__(self, n, sk, arith, rng, pool_size=1024, window=8, background=True):
+        self.n = n
+        self.sk = sk
+        self.arith = arith
+        self.rng = rng
+        if arith.p is not None:
+            self.tables = (FixedBaseTable(sk, arith.p, window), FixedBaseTable(sk, arith.q, window))
+        else:
+            self.tables = (FixedBaseTable(sk, n, window),)
+        self.pool = queue.Queue(maxsize=pool_size)
+        self._stop = threading.Event()
+        self._worker = None
+        if background:
+            self._worker = threading.Thread(target=self._fill, daemon=True)
+            self._worker.start()
+
+    def _new_commitment(self):
+        r = randomZnElement(self.n, self.rng)
+        return r, self.arith.sqr(r)
+
+    def _fill(self):
+        while not self._stop.is_set():
+            item = self._new_commitment()
+            while not self._stop.is_set():
+                try:
+                    self.pool.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+    def commitment(self):
+        # precomputed pair when available, otherwise computed inline
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            return self._new_commitment()
+
+    def sk_pow(self, e):
+        parts = [table.pow(e) for table in self.tables]
+        if parts[0] is None:
+            return self.arith.pow(self.sk, e)
+        if len(parts) == 2:
+            return self.arith.crt(*parts)
+        return parts[0]
+
+    def close(self):
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join()
+
+def fs_challenge(a, m):
+    # e = H(a || m) for the signature scheme
+    return int.from_bytes(hashlib.sha256(a.to_bytes(256, 'big') + m).digest(), 'big')
+
+
+def _screen(n, x, terms, failed, checked):
+    # Prefilter for one key. terms holds, per signature, (i, a^c, b^c, c*e, a, b, e)
+    # for a random weight c; if prod(b_i^c_i)^2 != prod(a_i^c_i) * x^(sum c_i e_i)
+    # the group contains a bad item and is split in half (reusing the weighted
+    # terms) until single items are checked directly. A passing equation proves
+    # nothing: errors of order 2 in Z_n^* (e.g. a = -r^2 with b^2 = -a*x^e, which
+    # anyone can produce) cancel in pairs, so every item not flagged here is
+    # still checked with its own pow by _verify_items.
+    if len(terms) <= 2:
+        for i, _, _, _, a, b, e in terms:
+            checked.add(i)
+            if pow(b, 2, n) != a * pow(x, e, n) % n:
+                failed.append(i)
+        return
+    A = B = 1
+    E = 0
+    for _, ac, bc, ce, _, _, _ in terms:
+        A = A * ac % n
+        B = B * bc % n
+        E += ce
+    if B * B % n == A * pow(x, E, n) % n:
+        return
+    mid = len(terms) // 2
+    _screen(n, x, terms[:mid], failed, checked)
+    _screen(n, x, terms[mid:], failed, checked)
+
+
+def _verify_items(items, offset, seed, weight_bits):
+    # items: list of (pk, m, sigma); returns the failed indices (shifted by offset)
+    rng = make_rng("sim", seed)
+    failed = []
+    groups = {}
+    for i, (pk, m, sigma) in enumerate(items, offset):
+        try:
+            n, x = pk
+            a, b, e = sigma
+            ok = 0 < a < n and 0 < b < n and e == fs_challenge(a, m)
+        except (TypeError, ValueError, OverflowError):
+            ok = False
+        if ok:
+            groups.setdefault((n, x), []).append((i, a, b, e))
+        else:
+            failed.append(i)
+    for (n, x), group in groups.items():
+        checked = set()
+        if weight_bits:
+            terms = []
+            for i, a, b, e in group:
+                c = rng.getrandbits(weight_bits)
+                terms.append((i, pow(a, c, n), pow(b, c, n), c * e, a, b, e))
+            _screen(n, x, terms, failed, checked)
+        # every item is accepted only by its own check
+        for i, a, b, e in group:
+            if i not in checked and pow(b, 2, n) != a * pow(x, e, n) % n:
+                failed.append(i)
+    return failed
+
+
+def _verify_chunk(args):
+    return _verify_items(*args)
+
 class FiatShamirSignature:
-    def __init__(self):
+    def __init__(self, rng=None):
         self.context = None  # (n, x, y)
+        self.arith = None  # ModArith with the factors of n, set by Gen
+        self.precomputation = None  # SigningPrecomputation, see enable_precomputation
+        self.rng = rng if rng is not None else make_rng("csprng")
 
     def Gen(self, n):
-        prover = FSI_Prover("1" * (n // 8))
+        prover = FSI_Prover("1" * (n // 8), self.rng)
         n_val, x = prover.get_public_key()
         y = prover.y
         self.context = (n_val, x, y)
+        self.arith = prover.arith
         return (n_val, x), y
 
+    def enable_precomputation(self, pool_size=1024, window=8, background=True):
+        # offline/online signing for the key from Gen
+        n, x, y = self.context
+        rng = self.rng.spawn(1)[0] if hasattr(self.rng, "spawn") else make_rng("csprng")
+        self.disable_precomputation()
+        self.precomputation = SigningPrecomputation(n, y, self.arith, rng, pool_size, window, background)
+
+    def disable_precomputation(self):
+        if self.precomputation is not None:
+            self.precomputation.close()
+            self.precomputation = None
+
     def Sign(self, sk, m):
         n, x, stored_sk = self.context
+        pre = self.precomputation
+
+        if pre is not None and sk == pre.sk:
+            # online step: pooled commitment, hash, table-driven sk^e
+            r, a = pre.commitment()
+            e = fs_challenge(a, m)
+            b = self.arith.mul(r, pre.sk_pow(e))
+            return (a, b, e)
 
-        r = randomZnElement(n)
-        a = pow(r, 2, n)
+        r = randomZnElement(n, self.rng)
+        a = self.arith.sqr(r)
 
-        challenge_input = a.to_bytes(256, 'big') + m
-        e = int.from_bytes(hashlib.sha256(challenge_input).digest(), 'big') % (2 ** 256)
+        e = fs_challenge(a, m)
 
-        b = (r * pow(sk, e, n)) % n
+        b = self.arith.mul(r, self.arith.pow(sk, e))
         return (a, b, e)
 
     def Verify(self, pk, m, sigma):
         n, x = pk
         a, b, e = sigma
 
-        challenge_input = a.to_bytes(256, 'big') + m
-        expected_e = int.from_bytes(hashlib.sha256(challenge_input).digest(), 'big') % (2 ** 256)
+        if not (0 < a < n and 0 < b < n):
+            # a = b = 0 would satisfy the equation for any key
+            print("a, b out of range")
+            return False
+
+        expected_e = fs_challenge(a, m)
 
         if e != expected_e:
             print(f"{e} != {expected_e}")
@@ -293,6 +602,32 @@ class FiatShamirSignature:
         print(f"Verification: {left} == {right}? {left == right}")
         return left == right
 
+    def verify_batch(self, items, processes=None, weight_bits=0, chunk_size=20000):
+        """Verifies many (pk, m, sigma) tuples without printing.
+
+        Hashes are checked per item and every signature is accepted only by its
+        own b^2 == a * x^e check, so the results match Verify. The speed-up comes
+        from spreading batches larger than chunk_size across a process pool
+        (processes=1 keeps everything in this process).
+        weight_bits > 0 additionally runs the randomized per-key equation of
+        _screen first; it only helps locate bad items and costs two extra
+        exponentiations per item, so it is off by default.
+        Returns (list of bool per item, list of failed indices).
+        """
+        items = list(items)
+        chunks = [(items[i:i + chunk_size], i, self.rng.getrandbits(128), weight_bits)
+                  for i in range(0, len(items), chunk_size)]
+        if len(chunks) > 1 and processes != 1:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                failed = [i for part in pool.map(_verify_chunk, chunks) for i in part]
+        else:
+            failed = [i for chunk in chunks for i in _verify_items(*chunk)]
+        failed.sort()
+        results = [True] * len(items)
+        for i in failed:
+            results[i] = False
+        return results, failed
+
 
 def test_signature_scheme():
     print("\n" + "=" * 60)
@@ -317,6 +652,21 @@ def test_signature_scheme():
 
     return True
 
+def test_batch_verification():
+    print("\n" + "=" * 60)
+    print("TEST batch verification")
+    print("=" * 60)
+
+    fs_sig = FiatShamirSignature()
+    pk, sk = fs_sig.Gen(256)
+    items = [(pk, b"msg%d" % i, fs_sig.Sign(sk, b"msg%d" % i)) for i in range(200)]
+    a, b, e = items[17][2]
+    items[17] = (pk, items[17][1], (a, b + 1, e))  # broken signature
+    items[42] = (pk, b"other message", items[42][2])  # signature of a different message
+    results, failed = fs_sig.verify_batch(items)
+    print(f"{results.count(True)} valid, failed indices: {failed}")
+    return failed == [17, 42]
+
 def test_honest_prover():
     print("\n" + "=" * 50)
     print("TEST Honest")
@@ -341,6 +691,18 @@ def test_dishonest_prover():
     print(f"Dishonest (result: {result})")
 
 
+def test_parallel_fsi():
+    print("\n" + "=" * 50)
+    print("TEST Parallel (t = 80)")
+    print("=" * 50)
+
+    w = "1010101010101010"
+    honest = FSI_Parallel(w, t=80).run()
+    dishonest = FSI_Parallel(w, t=80, dishonest=True).run()
+    print(f"Honest: {honest}, Dishonest: {dishonest}")
+    return honest and not dishonest
+
+
 def run_all_tests():
     print("Tests")
     print("=" * 60)
@@ -348,7 +710,9 @@ def run_all_tests():
     tests = [
         test_honest_prover,
         test_dishonest_prover,
+        test_parallel_fsi,
         test_signature_scheme,
+        test_batch_verification,
     ]
 
     for test in tests:
@@ -0,0 +1,509 @@
+import asyncio, socket, sys, time, uuid
+from tls_context import for_spec
+from ring_link import read_msg, write_msg
+from wire import KIND_RING, KIND_TREE_START, KIND_TREE_MASK, KIND_TREE_UP, KIND_SHARE, KIND_SHARE_PARTIAL
+from ring_values import parse_value, draw_mask, add_mod, sub_mod, format_value
+from topology import load_default
+
+
+class AsyncRingNode:
+    """Węzeł pierścienia na asyncio - jedna pętla zdarzeń zamiast wątku na połączenie.
+
+    Semantyka jak w SecureRingNode z node.py: inicjator maskuje swoją wartość
+    losowym R, pozostałe węzły dodają swoje wartości mod N, a inicjator po
+    powrocie sumy odejmuje R. Każda runda ma własne id sesji, R i future
+    z wynikiem, więc wiele rund może krążyć w pierścieniu jednocześnie.
+
+    Tryb drzewa (run_tree_round): węzły tworzą drzewo k-arne zakorzenione
+    w inicjatorze. Inicjator ogłasza sesję wszystkim węzłom, a każda para
+    węzłów spoza korzenia wymienia losowe maski znoszące się w sumie (nadawca
+    odejmuje maskę, odbiorca ją dodaje). Każdy węzeł odsyła rodzicowi swoją
+    wartość + maski + sumy od dzieci, więc korzeń dostaje dokładną sumę, ale
+    nie zna masek między węzłami i nie odczyta sum poszczególnych poddrzew.
+    Runda trwa jedną równoległą wymianę masek i O(log_k n) skoków zamiast n.
+
+    Tryb udziałów (run_shares_round): każdy węzeł dzieli swoją wartość na n
+    losowych udziałów mod N i równolegle rozsyła je wszystkim, każdy publikuje
+    inicjatorowi sumę otrzymanych udziałów. Stała liczba rund komunikacji
+    niezależnie od n, a wolny węzeł opóźnia rundę tylko o własne opóźnienie.
+    """
+
+    def __init__(self, node_id, my_value, round_timeout=30, topology=None):
+        self.node_id = node_id
+        self.my_value = my_value
+        self.topology = topology if topology is not None else load_default()
+        self.spec = self.topology.spec(node_id)
+        self.next_spec = self.topology.next_of(node_id)
+        self.port = self.spec.port
+        self.N = 1500 # takie N, że wiemy że suma na pewno nie przekroczy N
+        self.round_timeout = round_timeout # domyślny limit czasu rundy w sekundach
+        self.sessions = {}  # id sesji -> (R, future) dla rund zainicjowanych tutaj
+        self.tree_sessions = {}  # id sesji -> TreeRound dla rund w trybie drzewa
+        self.share_sessions = {}  # id sesji -> SharesRound dla rund w trybie udziałów
+        self._prune_at = 0.0  # najbliższe usuwanie przeterminowanych stanów drzewa/udziałów
+
+        # PKI paths
+        self.CA_CERT = self.spec.ca_cert
+        self.SERVER_CERT = self.spec.server_cert
+        self.SERVER_KEY = self.spec.server_key
+        self.CLIENT_CERT = self.spec.client_cert
+        self.CLIENT_KEY = self.spec.client_key
+        self.tls = for_spec(self.spec)
+
+        self._server = None
+        self._handlers = set()
+        self._writers = {}  # id węzła -> trwałe połączenie wychodzące
+        # id węzła -> kolejka wiadomości opróżniana przez osobne zadanie piszące, żeby
+        # zadanie czytające połączenie przychodzące nie czekało na drain() u wolnego odbiorcy
+        self._queues = {}
+        self._writer_tasks = set()
+
+    async def start_server(self):
+        self._server = await asyncio.start_server(
+            self._handle_client, self.spec.host, self.port, ssl=self.tls.server_context())
+        print(f"[Node {self.node_id}] Async server listening on port {self.port}")
+
+    async def close(self):
+        for task in self._writer_tasks:
+            task.cancel()
+        await asyncio.gather(*self._writer_tasks, return_exceptions=True)
+        self._writer_tasks.clear()
+        self._queues.clear()
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for task in list(self._handlers):
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+    async def _handle_client(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while True:
+                msg = await read_msg(reader)
+                if msg is None:
+                    break
+                try:
+                    await self.handle_message(msg)
+                except Exception as e:
+                    # błąd jednej rundy nie zrywa połączenia używanego przez pozostałe
+                    print(f"[-] Node {self.node_id} error handling message: {e}")
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[-] Node {self.node_id} error handling connection: {e}")
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    async def handle_message(self, msg):
+        if msg["kind"] in (KIND_SHARE, KIND_SHARE_PARTIAL):
+            await self.handle_share_message(msg)
+            return
+        if msg["kind"] != KIND_RING:
+            await self.handle_tree_message(msg)
+            return
+
+        current_sum = msg["sum"]
+        initiator = msg["initiator"]
+        session_id = msg["session"]
+
+        # po powrocie do inicjatora odzyskujemy prawidłową sumę
+        if self.node_id == initiator:
+            entry = self.sessions.pop(session_id, None)
+            if entry is None:
+                print(f"[-] Node {self.node_id} got result for unknown session {session_id}")
+                return
+            R, result = entry
+            if not result.done():
+                result.set_result(sub_mod(current_sum, R, self.N))
+        # przekazanie dalej w pierścieniu
+        else:
+            current_sum = add_mod(current_sum, self.my_value, self.N)
+            self.forward_to_next(current_sum, initiator, session_id)
+
+    async def _connect(self, peer):
+        _, writer = await asyncio.open_connection(
+            peer.host, peer.port,
+            ssl=self.tls.client_context(), server_hostname=peer.server_hostname)
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._writers[peer.node_id] = writer
+
+    def post(self, peer_id, msg, done=None):
+        """Wstawia wiadomość do kolejki połączenia z peer_id i wraca od razu.
+
+        done - opcjonalny future ustawiany po zapisie (albo wyjątkiem przy błędzie);
+        bez niego błąd wysłania jest tylko wypisywany.
+        """
+        queue = self._queues.get(peer_id)
+        if queue is None:
+            queue = self._queues[peer_id] = asyncio.Queue()
+            task = asyncio.create_task(self._write_loop(peer_id, queue))
+            self._writer_tasks.add(task)
+            task.add_done_callback(self._writer_tasks.discard)
+        queue.put_nowait((msg, done))
+
+    async def send_to(self, peer_id, msg):
+        """Wysyła wiadomość przez kolejkę połączenia i czeka na jej zapis"""
+        done = asyncio.get_running_loop().create_future()
+        self.post(peer_id, msg, done)
+        await done
+
+    async def _write_loop(self, peer_id, queue):
+        peer = self.topology.spec(peer_id)
+        while True:
+            msg, done = await queue.get()
+            try:
+                await self._write(peer, msg)
+            except Exception as e:
+                if done is None:
+                    print(f"[-] Node {self.node_id} could not send to Node {peer_id}: {e}")
+                elif not done.done():
+                    done.set_exception(e)
+            else:
+                if done is not None and not done.done():
+                    done.set_result(None)
+
+    async def _write(self, peer, msg):
+        """Zapis trwałym połączeniem do węzła peer (jedna próba ponownego połączenia)"""
+        for attempt in range(2):
+            try:
+                writer = self._writers.get(peer.node_id)
+                if writer is None or writer.is_closing():
+                    await self._connect(peer)
+                    writer = self._writers[peer.node_id]
+                write_msg(writer, msg)
+                await writer.drain()
+                return
+            except (OSError, ConnectionError):
+                self._writers.pop(peer.node_id, None)
+                if attempt == 1:
+                    raise
+
+    def forward_to_next(self, current_sum, initiator, session_id):
+        """Wstawia sumę do kolejki połączenia z następnym węzłem w pierścieniu"""
+        self.post(self.next_spec.node_id, {"sum": current_sum, "initiator": initiator, "session": session_id})
+
+    async def initiate_protocol(self):
+        """Rozpoczyna nową rundę jako inicjator; zwraca (id sesji, future z wynikiem) albo None"""
+        session_id = uuid.uuid4().hex
+        R = draw_mask(self.my_value, 1, 2000)
+        result = asyncio.get_running_loop().create_future()
+        self.sessions[session_id] = (R, result)
+        value_to_send = add_mod(self.my_value, R, self.N)
+        try:
+            await self.send_to(self.next_spec.node_id,
+                               {"sum": value_to_send, "initiator": self.node_id, "session": session_id})
+        except Exception as e:
+            print(f"[-] Node {self.node_id} could not initiate protocol: {e}")
+            del self.sessions[session_id]
+            return None
+        return session_id, result
+
+    async def run_round(self, timeout=None):
+        """Jedna pełna runda - czeka na future zamiast odpytywać stan"""
+        if timeout is None:
+            timeout = self.round_timeout
+        started = await self.initiate_protocol()
+        if started is None:
+            return None
+        session_id, result = started
+        try:
+            return await asyncio.wait_for(result, timeout)
+        except asyncio.TimeoutError:
+            print(f"[Node {self.node_id}] Timeout waiting for result (session {session_id})")
+            self.sessions.pop(session_id, None)
+            return None
+
+    async def run_rounds(self, count, timeout=None):
+        """Uruchamia count rund naraz i zwraca listę wyników"""
+        return await asyncio.gather(*(self.run_round(timeout) for _ in range(count)))
+
+
+    def _prune_expired(self):
+        """Usuwa stany rund drzewa/udziałów po terminie (węzły spoza korzenia nie dostają timeoutu)"""
+        now = time.monotonic()
+        if now < self._prune_at:
+            return
+        self._prune_at = now + 1.0
+        for table in (self.tree_sessions, self.share_sessions):
+            for session_id in [sid for sid, state in table.items() if state.deadline < now]:
+                del table[session_id]
+
+    def _tree_round(self, session_id, root, k):
+        state = self.tree_sessions.get(session_id)
+        if state is None:
+            children = self.topology.tree_children(self.node_id, root, k)
+            state = TreeRound(root, k, len(children), self.my_value, time.monotonic() + self.round_timeout)
+            if root != self.node_id:
+                state.pending_masks = len(self.topology) - 2  # od każdego węzła poza korzeniem i sobą
+            else:
+                state.masks_sent = True  # korzeń nie wymienia masek
+            self.tree_sessions[session_id] = state
+        return state
+
+    def _send_tree_masks(self, session_id, state):
+        """Wysyła losową maskę każdemu węzłowi poza korzeniem i odejmuje ją od swojej sumy"""
+        state.masks_sent = True
+        for peer_id in self.topology.order:
+            if peer_id in (self.node_id, state.root):
+                continue
+            mask = draw_mask(self.my_value, 0, self.N - 1)
+            state.acc = sub_mod(state.acc, mask, self.N)
+            self.post(peer_id, {"sum": mask, "initiator": state.root, "session": session_id,
+                                "kind": KIND_TREE_MASK, "arity": state.k})
+
+    async def handle_tree_message(self, msg):
+        self._prune_expired()
+        session_id = msg["session"]
+        root = msg["initiator"]
+        if msg["kind"] in (KIND_TREE_START, KIND_TREE_MASK):
+            state = self._tree_round(session_id, root, msg["arity"])
+            if msg["kind"] == KIND_TREE_MASK:
+                state.acc = add_mod(state.acc, msg["sum"], self.N)
+                state.pending_masks -= 1
+            # maska od innego węzła może przyjść przed ogłoszeniem sesji - wtedy też zaczynamy
+            if not state.masks_sent:
+                self._send_tree_masks(session_id, state)
+        elif msg["kind"] == KIND_TREE_UP:
+            if root == self.node_id and session_id not in self.tree_sessions:
+                print(f"[-] Node {self.node_id} got result for unknown session {session_id}")
+                return
+            state = self._tree_round(session_id, root, msg["arity"])
+            state.acc = add_mod(state.acc, msg["sum"], self.N)
+            state.pending -= 1
+        else:
+            raise ValueError(f"unknown message kind {msg['kind']}")
+        self._tree_maybe_finish(session_id, state)
+
+    def _tree_maybe_finish(self, session_id, state):
+        if state.pending > 0 or state.pending_masks > 0 or not state.masks_sent:
+            return
+        # sesję mogło już zamknąć inne wywołanie (np. dzieci skończyły w trakcie rozsyłania)
+        if self.tree_sessions.pop(session_id, None) is None:
+            return
+        if state.root == self.node_id:
+            # maski par węzłów znoszą się w sumie, więc acc to prawdziwa suma
+            if not state.result.done():
+                state.result.set_result(state.acc)
+        else:
+            parent = self.topology.tree_parent(self.node_id, state.root, state.k)
+            self.post(parent, {"sum": state.acc, "initiator": state.root, "session": session_id,
+                               "kind": KIND_TREE_UP, "arity": state.k})
+
+    async def initiate_tree(self, k=2):
+        """Rozpoczyna rundę w trybie drzewa k-arnego; zwraca (id sesji, future z wynikiem) albo None"""
+        session_id = uuid.uuid4().hex
+        state = self._tree_round(session_id, self.node_id, k)
+        state.result = asyncio.get_running_loop().create_future()
+
+        # korzeń tylko ogłasza sesję - maski wymieniają między sobą pozostałe węzły,
+        # więc korzeń nie zna żadnej z nich
+        try:
+            await asyncio.gather(*(
+                self.send_to(peer_id, {"sum": 0, "initiator": self.node_id, "session": session_id,
+                                       "kind": KIND_TREE_START, "arity": k})
+                for peer_id in self.topology.order if peer_id != self.node_id))
+        except Exception as e:
+            print(f"[-] Node {self.node_id} could not initiate tree round: {e}")
+            self.tree_sessions.pop(session_id, None)
+            return None
+        self._tree_maybe_finish(session_id, state)  # pierścień z jednym węzłem
+        return session_id, state.result
+
+    async def run_tree_round(self, k=2, timeout=None):
+        """Jedna runda w trybie drzewa - O(log_k n) skoków"""
+        if timeout is None:
+            timeout = self.round_timeout
+        started = await self.initiate_tree(k)
+        if started is None:
+            return None
+        session_id, result = started
+        try:
+            return await asyncio.wait_for(result, timeout)
+        except asyncio.TimeoutError:
+            print(f"[Node {self.node_id}] Timeout waiting for tree result (session {session_id})")
+            self.tree_sessions.pop(session_id, None)
+            return None
+
+
+    def _split(self, value, count):
+        """Dzieli wartość na count udziałów addytywnych mod N"""
+        shares = [draw_mask(value, 0, self.N - 1) for _ in range(count - 1)]
+        last = value
+        for share in shares:
+            last = sub_mod(last, share, self.N)
+        shares.append(last)
+        return shares
+
+    def _share_round(self, session_id, initiator):
+        state = self.share_sessions.get(session_id)
+        if state is None:
+            state = SharesRound(initiator, len(self.topology), time.monotonic() + self.round_timeout)
+            self.share_sessions[session_id] = state
+        return state
+
+    async def _send_shares(self, session_id, state, wait=False):
+        """Rozsyła równolegle udziały własnej wartości (swój udział zostawia u siebie).
+
+        wait=True czeka na zapis wszystkich udziałów (u inicjatora, żeby wykryć błąd
+        połączenia); przy obsłudze wiadomości udziały idą tylko do kolejek.
+        """
+        state.shares_sent = True
+        peers = self.topology.order
+        shares = self._split(self.my_value, len(peers))
+        sends = []
+        for peer_id, share in zip(peers, shares):
+            if peer_id == self.node_id:
+                state.add_share(share, self.N)
+                continue
+            msg = {"sum": share, "initiator": state.initiator, "session": session_id, "kind": KIND_SHARE}
+            if wait:
+                sends.append(self.send_to(peer_id, msg))
+            else:
+                self.post(peer_id, msg)
+        await asyncio.gather(*sends)
+
+    async def handle_share_message(self, msg):
+        self._prune_expired()
+        session_id = msg["session"]
+        initiator = msg["initiator"]
+        if msg["kind"] == KIND_SHARE_PARTIAL:
+            state = self.share_sessions.get(session_id)
+            if initiator != self.node_id or state is None:
+                print(f"[-] Node {self.node_id} got partial sum for unknown session {session_id}")
+                return
+            state.add_partial(msg["sum"], self.N)
+        else:
+            state = self._share_round(session_id, initiator)
+            state.add_share(msg["sum"], self.N)
+            # pierwszy udział w nowej sesji to sygnał do rozesłania własnych
+            if not state.shares_sent:
+                await self._send_shares(session_id, state)
+        self._share_maybe_publish(session_id, state)
+
+    def _share_maybe_publish(self, session_id, state):
+        if state.pending_shares == 0 and not state.published:
+            state.published = True
+            if state.initiator == self.node_id:
+                state.add_partial(state.acc, self.N)
+            else:
+                del self.share_sessions[session_id]
+                self.post(state.initiator, {"sum": state.acc, "initiator": state.initiator,
+                                            "session": session_id, "kind": KIND_SHARE_PARTIAL})
+        if state.initiator == self.node_id and state.pending_partials == 0:
+            self.share_sessions.pop(session_id, None)
+            if not state.result.done():
+                state.result.set_result(state.total)
+
+    async def initiate_shares(self):
+        """Rozpoczyna rundę w trybie udziałów; zwraca (id sesji, future z wynikiem) albo None"""
+        session_id = uuid.uuid4().hex
+        state = self._share_round(session_id, self.node_id)
+        state.result = asyncio.get_running_loop().create_future()
+        try:
+            await self._send_shares(session_id, state, wait=True)
+            self._share_maybe_publish(session_id, state)  # pierścień z jednym węzłem
+        except Exception as e:
+            print(f"[-] Node {self.node_id} could not initiate shares round: {e}")
+            self.share_sessions.pop(session_id, None)
+            return None
+        return session_id, state.result
+
+    async def run_shares_round(self, timeout=None):
+        """Jedna runda w trybie udziałów addytywnych - stała liczba rund komunikacji"""
+        if timeout is None:
+            timeout = self.round_timeout
+        started = await self.initiate_shares()
+        if started is None:
+            return None
+        session_id, result = started
+        try:
+            return await asyncio.wait_for(result, timeout)
+        except asyncio.TimeoutError:
+            print(f"[Node {self.node_id}] Timeout waiting for shares result (session {session_id})")
+            self.share_sessions.pop(session_id, None)
+            return None
+
+
+class SharesRound:
+    """Stan węzła w jednej rundzie udziałów addytywnych"""
+    def __init__(self, initiator, num_nodes, deadline):
+        self.initiator = initiator
+        self.deadline = deadline  # time.monotonic() po którym stan jest usuwany
+        self.pending_shares = num_nodes
+        self.acc = 0
+        self.shares_sent = False
+        self.published = False
+        self.pending_partials = num_nodes  # tylko u inicjatora
+        self.total = 0
+        self.result = None
+
+    def add_share(self, share, N):
+        self.acc = add_mod(self.acc, share, N)
+        self.pending_shares -= 1
+
+    def add_partial(self, partial, N):
+        self.total = add_mod(self.total, partial, N)
+        self.pending_partials -= 1
+
+
+class TreeRound:
+    """Stan węzła w jednej rundzie drzewa: suma częściowa i liczba brakujących dzieci"""
+    def __init__(self, root, k, pending, my_value, deadline):
+        self.root = root
+        self.deadline = deadline  # time.monotonic() po którym stan jest usuwany
+        self.k = k
+        self.pending = pending
+        self.acc = my_value
+        self.pending_masks = 0    # brakujące maski od innych węzłów
+        self.masks_sent = False
+        self.result = None  # tylko u korzenia - future z wynikiem
+
+
+async def run_node(node_id, my_value, rounds, tree_k=0):
+    """tree_k > 0 - tryb drzewa k-arnego, tree_k == 0 - pierścień, tree_k < 0 - udziały addytywne"""
+    node = AsyncRingNode(node_id, my_value)
+    await node.start_server()
+    try:
+        if rounds:
+            await asyncio.sleep(2)  # czekamy aż wystartują pozostałe węzły
+            if tree_k < 0:
+                finals = await asyncio.gather(*(node.run_shares_round() for _ in range(rounds)))
+            elif tree_k:
+                finals = await asyncio.gather(*(node.run_tree_round(tree_k) for _ in range(rounds)))
+            else:
+                finals = await node.run_rounds(rounds)
+            for final in finals:
+                print(f"[Node {node_id}] Final sum: {format_value(final) if final is not None else None}")
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await node.close()
+
+
+def main():
+    if len(sys.argv) not in (3, 4, 5):
+        print("Usage: python3 async_node.py <node_id> <my_value> [rounds_to_initiate] [tree_arity]")
+        print("Example: python3 async_node.py 1 100 5")
+        print("Tree mode: python3 async_node.py 1 100 5 2 (binary tree instead of the ring)")
+        print("Shares mode: python3 async_node.py 1 100 5 -1 (additive secret sharing)")
+        sys.exit(1)
+
+    node_id = int(sys.argv[1])
+    my_value = parse_value(sys.argv[2])
+    rounds = int(sys.argv[3]) if len(sys.argv) >= 4 else 0
+    tree_k = int(sys.argv[4]) if len(sys.argv) == 5 else 0
+
+    try:
+        asyncio.run(run_node(node_id, my_value, rounds, tree_k))
+    except KeyboardInterrupt:
+        print("\nExiting...")
+
+if __name__ == "__main__":
+    main()
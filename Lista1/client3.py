@@ -1,34 +1,37 @@
-import socket, ssl, sys, random, json
+import socket, ssl, sys
+from ring_link import send_msg
+from ring_values import parse_value, draw_mask, format_value
+from topology import load_default
 
 if len(sys.argv) != 3:
     print("Usage: python3 client_initiator.py <initiator_node_id> <my_value>")
     sys.exit(1)
 
 NODE_ID = int(sys.argv[1])
-MY_VALUE = int(sys.argv[2])
+MY_VALUE = parse_value(sys.argv[2])  # '5' albo wektor '5,7,1'
 
-PORTS = {1:8441, 2:8442, 3:8443}
-NEXT_NODE = {1:2, 2:3, 3:1}
+TOPOLOGY = load_default()
 
 # --- inicjator maskuje swoją wartość ---
-R = random.randint(1,100)
+R = draw_mask(MY_VALUE, 1, 100)
 value_to_send = MY_VALUE + R
-next_node = NEXT_NODE[NODE_ID]
+next_spec = TOPOLOGY.next_of(NODE_ID)
+next_node = next_spec.node_id
 
-CA_CERT = "pki/ca/ca.crt"
-CLIENT_CERT = f"pki/client/client{NODE_ID}.crt"
-CLIENT_KEY  = f"pki/client/client{NODE_ID}.key"
+CA_CERT = TOPOLOGY.spec(NODE_ID).ca_cert
+CLIENT_CERT = TOPOLOGY.spec(NODE_ID).client_cert
+CLIENT_KEY  = TOPOLOGY.spec(NODE_ID).client_key
 
 try:
-    with socket.create_connection(("127.0.0.1", PORTS[next_node])) as sock:
+    with socket.create_connection((next_spec.host, next_spec.port)) as sock:
         context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=CA_CERT)
         context.load_cert_chain(certfile=CLIENT_CERT, keyfile=CLIENT_KEY)
-        with context.wrap_socket(sock, server_hostname="localhost") as ssock:
-            print(f"[Node {NODE_ID}] Initiating sum {value_to_send} to Node {next_node}")
-            ssock.sendall(json.dumps({"sum": value_to_send,
-                                      "initiator": NODE_ID,
-                                      "R": R}).encode())
+        with context.wrap_socket(sock, server_hostname=next_spec.server_hostname) as ssock:
+            print(f"[Node {NODE_ID}] Initiating sum {format_value(value_to_send)} to Node {next_node}")
+            send_msg(ssock, {"sum": value_to_send,
+                             "initiator": NODE_ID,
+                             "R": R})
 except Exception as e:
     print(f"[-] Could not initiate sum: {e}")
 
-print(f"[Node {NODE_ID}] Protocol started. Remember to subtract R={R} when sum returns to initiator.")
+print(f"[Node {NODE_ID}] Protocol started. Remember to subtract R={format_value(R)} when sum returns to initiator.")
@@ -1,33 +1,49 @@
-import socket, ssl, threading, json, sys, random, time
+import socket, threading, sys, time, uuid
+from tls_context import for_spec
+from ring_link import NextHopLink, recv_msg
+from ring_values import parse_value, draw_mask, add_mod, sub_mod, format_value
+from topology import load_default
 
-PORTS = {1: 8441, 2: 8442, 3: 8443}
-NEXT_NODE = {1: 2, 2: 3, 3: 1}
+class RingSession:
+    """Stan jednej rundy po stronie inicjatora - własna maska R i własny wynik"""
+    def __init__(self, session_id, R, deadline):
+        self.session_id = session_id
+        self.R = R
+        self.deadline = deadline  # time.monotonic() po którym runda jest porzucana
+        self.final_sum = None
+        self.done = threading.Event()  # ustawiane w chwili powrotu sumy do inicjatora
 
 class SecureRingNode:
-    def __init__(self, node_id, my_value):
+    def __init__(self, node_id, my_value, round_timeout=30, topology=None):
         self.node_id = node_id
         self.my_value = my_value
-        self.port = PORTS[node_id]
-        self.is_initiator = False
-        self.R = 0
+        self.topology = topology if topology is not None else load_default()
+        self.spec = self.topology.spec(node_id)
+        self.next_spec = self.topology.next_of(node_id)
+        self.port = self.spec.port
         self.N = 1500 # takie N, że wiemy że suma na pewno nie przekroczy N
-        self.received_final_sum = False
-        self.final_sum = None
-        self.protocol_active = False
+        self.round_timeout = round_timeout # domyślny limit czasu rundy w sekundach
+        # rundy zainicjowane przez ten węzeł, po id sesji niesionym w wiadomości
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
         
         # PKI paths
-        self.CA_CERT = "pki/ca/ca.crt"
-        self.SERVER_CERT = f"pki/server/server{node_id}.crt"
-        self.SERVER_KEY = f"pki/server/server{node_id}.key"
-        self.CLIENT_CERT = f"pki/client/client{node_id}.crt"
-        self.CLIENT_KEY = f"pki/client/client{node_id}.key"
+        self.CA_CERT = self.spec.ca_cert
+        self.SERVER_CERT = self.spec.server_cert
+        self.SERVER_KEY = self.spec.server_key
+        self.CLIENT_CERT = self.spec.client_cert
+        self.CLIENT_KEY = self.spec.client_key
+        self.tls = for_spec(self.spec)
+        # jedno trwałe połączenie do następnego węzła, współdzielone przez wszystkie rundy
+        self.next_link = NextHopLink(self.next_spec.host, self.next_spec.port, self.tls,
+                                     self.next_spec.server_hostname, on_error=self._forward_failed)
 
     def start_server(self):
         """Uruchamia serwer w osobnym wątku"""
         def server_loop():
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            sock.bind(("127.0.0.1", self.port))
+            sock.bind((self.spec.host, self.port))
             sock.listen(5)
             print(f"[Node {self.node_id}] Server listening on port {self.port}")
 
@@ -38,151 +54,148 @@ class SecureRingNode:
         threading.Thread(target=server_loop, daemon=True).start()
 
     def reset_protocol_state(self):
-        self.is_initiator = False
-        self.R = 0
-        self.received_final_sum = False
-        self.final_sum = None
-        self.protocol_active = False
+        """Porzuca wszystkie niezakończone rundy tego węzła"""
+        with self.sessions_lock:
+            self.sessions.clear()
         print(f"[Node {self.node_id}] Protocol state reset - ready for next round")
 
     def handle_client(self, conn, addr):
+        tls_conn = None
         try:
-            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-            context.verify_mode = ssl.CERT_REQUIRED
-            context.load_cert_chain(certfile=self.SERVER_CERT, keyfile=self.SERVER_KEY)
-            context.load_verify_locations(cafile=self.CA_CERT)
-
+            context = self.tls.server_context()
             tls_conn = context.wrap_socket(conn, server_side=True)
-            data = tls_conn.recv(1024)
-            
-            if not data:
+
+            # poprzedni węzeł trzyma to połączenie otwarte - czytamy kolejne ramki aż do EOF
+            while True:
+                msg = recv_msg(tls_conn)
+                if msg is None:
+                    break
+                try:
+                    self.handle_message(msg)
+                except Exception as e:
+                    # błąd jednej rundy nie zrywa połączenia używanego przez pozostałe
+                    print(f"[-] Node {self.node_id} error handling message: {e}")
+
+        except Exception as e:
+            print(f"[-] Node {self.node_id} error handling connection: {e}")
+
+        finally:
+            if tls_conn is not None:
                 tls_conn.close()
-                return
+            else:
+                conn.close()
 
-            msg = json.loads(data.decode())
-            current_sum = msg["sum"]
-            initiator = msg["initiator"]
+    def handle_message(self, msg):
+        current_sum = msg["sum"]
+        initiator = msg["initiator"]
+        session_id = msg["session"]
 
-            print(f"\n[Node {self.node_id}] Received sum={current_sum} from previous node. Initiator: Node {initiator}")
+        print(f"\n[Node {self.node_id}] Received sum={format_value(current_sum)} from previous node. Initiator: Node {initiator}, session {session_id}")
 
-            # po powrocie do inicjatora odzyskujemy prawidłową sumę
-            if self.node_id == initiator:
-                final_sum = (current_sum - self.R) % self.N
-                self.final_sum = final_sum
-                self.received_final_sum = True
+        # po powrocie do inicjatora odzyskujemy prawidłową sumę
+        if self.node_id == initiator:
+            with self.sessions_lock:
+                session = self.sessions.get(session_id)
+            if session is None:
+                print(f"[-] Node {self.node_id} got result for unknown session {session_id}")
+                return
 
-                print(f"\n{'='*50}")
-                print(f"[Node {self.node_id}] FINAL SUM after subtracting R={self.R}: {final_sum}")
-                print(f"{'='*50}\n")
+            final_sum = sub_mod(current_sum, session.R, self.N)
+            session.final_sum = final_sum
+            session.done.set()
 
-                time.sleep(2)
-                self.reset_protocol_state()
-                
-            # przekazanie dalej w pierścieniu
-            else:
-                current_sum = (current_sum + self.my_value) % self.N
+            print(f"\n{'='*50}")
+            print(f"[Node {self.node_id}] FINAL SUM after subtracting R={format_value(session.R)}: {format_value(final_sum)}")
+            print(f"{'='*50}\n")
 
-                print(f"[Node {self.node_id}] Added my value {self.my_value}, new sum: {current_sum}")
+        # przekazanie dalej w pierścieniu
+        else:
+            current_sum = add_mod(current_sum, self.my_value, self.N)
 
-                time.sleep(0.5)
-                success = self.forward_to_next(current_sum, initiator)
-                
-                if success:
-                    time.sleep(2)
-                    self.reset_protocol_state()
+            print(f"[Node {self.node_id}] Added my value {format_value(self.my_value)}, new sum: {format_value(current_sum)}")
 
-        except Exception as e:
-            print(f"[-] Node {self.node_id} error handling connection: {e}")
-            self.reset_protocol_state()
+            self.forward_to_next(current_sum, initiator, session_id)
 
-        finally:
-            tls_conn.close()
+    def forward_to_next(self, current_sum, initiator, session_id):
+        """Przekazuje sumę do następnego węzła przez kolejkę łącza (nie blokuje wątku czytającego)"""
+        self.next_link.post({"sum": current_sum, "initiator": initiator, "session": session_id})
+        print(f"[Node {self.node_id}] Queued sum={format_value(current_sum)} for Node {self.next_spec.node_id}")
 
-    def forward_to_next(self, current_sum, initiator):
-        """Przekazuje sumę do następnego węzła"""
-        next_node_id = NEXT_NODE[self.node_id]
-        try:
-            with socket.create_connection(("127.0.0.1", PORTS[next_node_id])) as sock:
-                context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=self.CA_CERT)
-                context.load_cert_chain(certfile=self.CLIENT_CERT, keyfile=self.CLIENT_KEY)
-                
-                with context.wrap_socket(sock, server_hostname="localhost") as ssock:
-                    send_msg = {"sum": current_sum, "initiator": initiator}
-                    ssock.sendall(json.dumps(send_msg).encode())
-                    
-            print(f"[Node {self.node_id}] Forwarded sum={current_sum} to Node {next_node_id}")
-            return True
-            
-        except Exception as e:
-            print(f"[-] Node {self.node_id} could not forward to Node {next_node_id}: {e}")
-            return False
-
-    def initiate_protocol(self):
-        """Rozpoczyna protokół jako inicjator"""
-        if self.protocol_active:
-            print(f"[Node {self.node_id}] Protocol already active, please wait...")
-            return False
-            
-        self.reset_protocol_state()
-        self.is_initiator = True
-        self.protocol_active = True
-        self.R = random.randint(1, 2000)
-        value_to_send = (self.my_value + self.R) % self.N
-        next_node_id = NEXT_NODE[self.node_id]
+    def _forward_failed(self, msg, error):
+        print(f"[-] Node {self.node_id} could not forward to Node {self.next_spec.node_id}: {error}")
+
+    def initiate_protocol(self, timeout=None):
+        """Rozpoczyna nową rundę jako inicjator; zwraca id sesji albo None.
 
-        print(f"\n[Node {self.node_id}] Starting protocol as INITIATOR")
-        print(f"[Node {self.node_id}] My value: {self.my_value}, R: {self.R}")
-        print(f"[Node {self.node_id}] Sending masked value: {value_to_send}")
+        Każda runda ma własne R, więc wiele rund może jednocześnie krążyć w pierścieniu.
+        timeout nadpisuje round_timeout dla tej rundy.
+        """
+        if timeout is None:
+            timeout = self.round_timeout
+        # dla wartości wektorowej R jest losowym wektorem tej samej długości
+        session = RingSession(uuid.uuid4().hex, draw_mask(self.my_value, 1, 2000), time.monotonic() + timeout)
+        value_to_send = add_mod(self.my_value, session.R, self.N)
+        next_node_id = self.next_spec.node_id
+        with self.sessions_lock:
+            self.sessions[session.session_id] = session
+
+        print(f"\n[Node {self.node_id}] Starting protocol as INITIATOR (session {session.session_id})")
+        print(f"[Node {self.node_id}] My value: {format_value(self.my_value)}, R: {format_value(session.R)}")
+        print(f"[Node {self.node_id}] Sending masked value: {format_value(value_to_send)}")
 
         try:
-            with socket.create_connection(("127.0.0.1", PORTS[next_node_id])) as sock:
-                context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=self.CA_CERT)
-                context.load_cert_chain(certfile=self.CLIENT_CERT, keyfile=self.CLIENT_KEY)
-                
-                with context.wrap_socket(sock, server_hostname="localhost") as ssock:
-                    ssock.sendall(json.dumps({
-                        "sum": value_to_send,
-                        "initiator": self.node_id
-                    }).encode())
-                    
+            self.next_link.send({
+                "sum": value_to_send,
+                "initiator": self.node_id,
+                "session": session.session_id
+            })
             print(f"[Node {self.node_id}] Initiated protocol to Node {next_node_id}")
-            return True
+            return session.session_id
             
         except Exception as e:
             print(f"[-] Node {self.node_id} could not initiate protocol: {e}")
-            self.reset_protocol_state()
-            return False
-
-    def wait_for_result(self):
-        if self.is_initiator:
-            print(f"[Node {self.node_id}] Waiting for sum to complete the ring...")
-            start_time = time.time()
-            while not self.received_final_sum:
-                if time.time() - start_time > 30:
-                    print(f"[Node {self.node_id}] Timeout waiting for result")
-                    self.reset_protocol_state()
-                    return None
-                time.sleep(0.1)
-            return self.final_sum
-        return None
+            self.discard_session(session.session_id)
+            return None
+
+    def discard_session(self, session_id):
+        with self.sessions_lock:
+            return self.sessions.pop(session_id, None)
+
+    def wait_for_result(self, session_id):
+        """Blokuje do powrotu sumy albo do upływu terminu rundy (bez odpytywania)"""
+        with self.sessions_lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        print(f"[Node {self.node_id}] Waiting for sum to complete the ring...")
+        completed = session.done.wait(max(0.0, session.deadline - time.monotonic()))
+        self.discard_session(session_id)
+        if not completed:
+            print(f"[Node {self.node_id}] Timeout waiting for result")
+            return None
+        return session.final_sum
 
     def check_protocol_status(self):
-        """Sprawdza czy protokół jest aktywny"""
-        return self.protocol_active
+        """Sprawdza czy jakaś runda tego węzła jest w toku"""
+        with self.sessions_lock:
+            return bool(self.sessions)
 
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python3 node.py <node_id> <my_value>")
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python3 node.py <node_id> <my_value> [round_timeout_s]")
         print("Example: python3 node.py 1 100")
+        print("Vector mode: python3 node.py 1 10,20,30 (all nodes need the same length)")
+        print("Ring layout is read from the JSON file in $RING_TOPOLOGY (default: 3 nodes on localhost)")
         sys.exit(1)
 
     node_id = int(sys.argv[1])
-    my_value = int(sys.argv[2])
+    my_value = parse_value(sys.argv[2])
+    round_timeout = float(sys.argv[3]) if len(sys.argv) == 4 else 30
 
-    node = SecureRingNode(node_id, my_value)
+    node = SecureRingNode(node_id, my_value, round_timeout)
     node.start_server()
 
-    print(f"[Node {node_id}] Started with value: {my_value}")
+    print(f"[Node {node_id}] Started with value: {format_value(my_value)}")
     print(f"[Node {node_id}] Waiting for other nodes to start...")
     
     time.sleep(2)
@@ -190,7 +203,7 @@ def main():
     while True:
         try:
             print(f"\n{'='*40}")
-            print(f"Node {node_id} - Current value: {my_value}")
+            print(f"Node {node_id} - Current value: {format_value(my_value)}")
             if node.check_protocol_status():
                 print("Status: PROTOCOL ACTIVE - please wait...")
                 time.sleep(2)
@@ -200,29 +213,44 @@ def main():
             
             print("Options:")
             print("  's' - Start protocol as initiator")
+            print("  'm' - Start several concurrent rounds as initiator")
             print("  'c' - Change my value")
             print("  'q' - Quit")
             choice = input("Select option: ").strip().lower()
             
             if choice == 's':
-                if node.initiate_protocol():
-                    final = node.wait_for_result()
+                session_id = node.initiate_protocol()
+                if session_id is not None:
+                    final = node.wait_for_result(session_id)
                     if final is not None:
-                        print(f"\n✓ Protocol completed! Final sum: {final}")
+                        print(f"\n✓ Protocol completed! Final sum: {format_value(final)}")
                     else:
                         print(f"\n✗ Protocol failed or timed out")
                         
+            elif choice == 'm':
+                try:
+                    count = int(input("Number of rounds: "))
+                except ValueError:
+                    print("Invalid value entered")
+                    continue
+                # wszystkie rundy startują od razu, wyniki zbieramy po kolei
+                session_ids = [node.initiate_protocol() for _ in range(count)]
+                for session_id in session_ids:
+                    final = node.wait_for_result(session_id) if session_id is not None else None
+                    print(f"  session {session_id}: {format_value(final) if final is not None else 'failed'}")
+
             elif choice == 'c':
                 try:
-                    new_value = int(input(f"Enter new value (current: {my_value}): "))
+                    new_value = parse_value(input(f"Enter new value (current: {format_value(my_value)}): "))
                     my_value = new_value
                     node.my_value = new_value
-                    print(f"[Node {node_id}] Value updated to: {my_value}")
+                    print(f"[Node {node_id}] Value updated to: {format_value(my_value)}")
                 except ValueError:
                     print("Invalid value entered")
                     
             elif choice == 'q':
                 print("Exiting...")
+                node.next_link.close()
                 break
             else:
                 print("Invalid option")
@@ -0,0 +1,195 @@
+import queue, select, socket, ssl, struct, threading, asyncio
+import wire
+
+# ramka: 4 bajty długości (big-endian) + treść (binarna wiadomość z wire.py)
+_LEN = struct.Struct("!I")
+MAX_FRAME = 16 * 1024 * 1024
+
+
+def recv_exact(sock, n):
+    """Czyta dokładnie n bajtów albo zwraca None gdy druga strona zamknęła połączenie"""
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if k == 0:
+            return None
+        got += k
+    return buf
+
+
+def send_frame(sock, payload):
+    sock.sendall(_LEN.pack(len(payload)) + payload)
+
+
+def recv_frame(sock):
+    header = recv_exact(sock, _LEN.size)
+    if header is None:
+        return None
+    (length,) = _LEN.unpack(header)
+    if length > MAX_FRAME:
+        raise ValueError(f"frame too large: {length} bytes")
+    return recv_exact(sock, length)
+
+
+def send_msg(sock, msg):
+    send_frame(sock, wire.encode(msg))
+
+
+def recv_msg(sock):
+    data = recv_frame(sock)
+    if data is None:
+        return None
+    return wire.decode(data)
+
+
+class NextHopLink:
+    """Długo żyjące połączenie mTLS do następnego węzła w pierścieniu.
+
+    Połączenie jest otwierane przy pierwszej wiadomości i potem używane
+    przez wszystkie kolejne rundy. Gdy zostanie zerwane, łączymy się
+    ponownie wznawiając poprzednią sesję TLS (bez pełnego handshake).
+
+    send() wysyła od razu i blokuje do zapisu. post() tylko wstawia wiadomość
+    do kolejki, którą opróżnia osobny wątek piszący - wątek czytający
+    połączenie przychodzące nie czeka wtedy na wolnego następnika (przy dużych
+    wektorach i kilku rundach naraz wszystkie węzły blokowały się na sendall).
+    Błąd wysłania z kolejki trafia do on_error(msg, wyjątek).
+    """
+
+    def __init__(self, host, port, tls, server_hostname="localhost", on_error=None):
+        self.host = host
+        self.port = port
+        self.tls = tls
+        self.server_hostname = server_hostname
+        self.on_error = on_error
+        self.connects = 0
+        self.resumed = 0
+        self._sock = None
+        self._session = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    def _connect(self):
+        raw = socket.create_connection((self.host, self.port))
+        raw.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            ssock = self.tls.client_context().wrap_socket(
+                raw, server_hostname=self.server_hostname, session=self._session)
+        except ssl.SSLError:
+            # np. sesja z poprzedniego kontekstu (po przeładowaniu certyfikatów)
+            raw.close()
+            self._session = None
+            raw = socket.create_connection((self.host, self.port))
+            raw.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            ssock = self.tls.client_context().wrap_socket(raw, server_hostname=self.server_hostname)
+        self.connects += 1
+        if ssock.session_reused:
+            self.resumed += 1
+        self._sock = ssock
+
+    def _drop(self):
+        if self._sock is not None:
+            # bilet sesji TLS 1.3 przychodzi po handshake'u i OpenSSL przetwarza go
+            # dopiero przy odczycie - stąd nieblokujący recv przed zapamiętaniem sesji
+            try:
+                self._sock.setblocking(False)
+                self._sock.recv(1)
+            except (OSError, ssl.SSLError):
+                pass
+            if self._sock.session is not None:
+                self._session = self._sock.session
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def _peer_closed(self):
+        # Następnik nic nie wysyła tym połączeniem, więc gotowość do odczytu znaczy
+        # EOF/reset albo same rekordy TLS (bilety sesji). Bez tego sprawdzenia
+        # pierwszy sendall do zamkniętego gniazda udaje się lokalnie i ramka ginie.
+        sock = self._sock
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        if not readable and not sock.pending():
+            return False
+        sock.setblocking(False)
+        try:
+            sock.recv(1)
+        except ssl.SSLWantReadError:
+            return False
+        except (OSError, ssl.SSLError):
+            return True
+        finally:
+            sock.setblocking(True)
+        # b"" (EOF) albo dane, których następnik nie powinien wysyłać
+        return True
+
+    def send(self, msg):
+        """Wysyła wiadomość; przy zerwanym połączeniu próbuje raz połączyć się ponownie"""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is not None and self._peer_closed():
+                        self._drop()
+                    if self._sock is None:
+                        self._connect()
+                    send_msg(self._sock, msg)
+                    if self._sock.session is not None:
+                        self._session = self._sock.session
+                    return
+                except (OSError, ssl.SSLError):
+                    self._drop()
+                    if attempt == 1:
+                        raise
+
+    def post(self, msg):
+        """Wstawia wiadomość do kolejki wątku piszącego i wraca od razu"""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, daemon=True)
+                self._writer.start()
+        self._queue.put(msg)
+
+    def _write_loop(self):
+        while True:
+            msg = self._queue.get()
+            if msg is None:
+                return
+            try:
+                self.send(msg)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(msg, e)
+
+    def close(self):
+        with self._writer_lock:
+            if self._writer is not None:
+                self._queue.put(None)  # wątek piszący kończy po opróżnieniu kolejki
+                self._writer = None
+        with self._lock:
+            self._drop()
+
+
+async def read_msg(reader):
+    """Odpowiednik recv_msg dla asyncio.StreamReader"""
+    try:
+        header = await reader.readexactly(_LEN.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = _LEN.unpack(header)
+    if length > MAX_FRAME:
+        raise ValueError(f"frame too large: {length} bytes")
+    data = await reader.readexactly(length)
+    return wire.decode(data)
+
+
+def write_msg(writer, msg):
+    payload = wire.encode(msg)
+    writer.write(_LEN.pack(len(payload)) + payload)
@@ -0,0 +1,36 @@
+import random
+import numpy as np
+
+# Wartość węzła to pojedynczy int albo wektor liczników (np.ndarray) - w trybie
+# wektorowym jedno okrążenie pierścienia sumuje cały wektor naraz.
+
+
+def parse_value(text):
+    """'100' -> 100, '1,2,3' -> array([1, 2, 3])"""
+    if "," in text:
+        return np.array([int(x) for x in text.split(",")], dtype=np.int64)
+    return int(text)
+
+
+def draw_mask(value, low, high):
+    """Losowa maska R tego samego kształtu co wartość inicjatora"""
+    if isinstance(value, np.ndarray):
+        return np.random.default_rng().integers(low, high, size=value.shape, dtype=np.int64, endpoint=True)
+    return random.randint(low, high)
+
+
+def add_mod(a, b, N):
+    # dla wektorów jedno wektorowe dodawanie mod N na każdym skoku
+    return (a + b) % N
+
+
+def sub_mod(a, b, N):
+    return (a - b) % N
+
+
+def format_value(value):
+    if isinstance(value, np.ndarray):
+        if value.size > 8:
+            return f"[{', '.join(map(str, value[:8].tolist()))}, ...] ({value.size} elements)"
+        return str(value.tolist())
+    return str(value)
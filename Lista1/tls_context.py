@@ -0,0 +1,82 @@
+import os, ssl, threading
+
+# ile kontekstów SSL zbudowano w całym procesie (wszystkie węzły razem)
+contexts_built = 0
+_counter_lock = threading.Lock()
+
+
+def _count_build():
+    global contexts_built
+    with _counter_lock:
+        contexts_built += 1
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class NodeTLSContexts:
+    """Kontekst serwera i klienta budowany raz na węzeł.
+
+    Pliki PEM są parsowane tylko przy pierwszym użyciu i ponownie dopiero
+    wtedy, gdy któryś z plików cert/key/CA zmieni się na dysku.
+    """
+
+    def __init__(self, ca_cert, server_cert, server_key, client_cert, client_key):
+        self.ca_cert = ca_cert
+        self.server_cert = server_cert
+        self.server_key = server_key
+        self.client_cert = client_cert
+        self.client_key = client_key
+        self.built = 0  # licznik dla tego węzła
+        self._lock = threading.Lock()
+        self._server_ctx = None
+        self._server_stamp = None
+        self._client_ctx = None
+        self._client_stamp = None
+
+    def _stamp(self, *paths):
+        return tuple(_mtime(p) for p in paths)
+
+    def _build_server(self):
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.verify_mode = ssl.CERT_REQUIRED
+        context.load_cert_chain(certfile=self.server_cert, keyfile=self.server_key)
+        context.load_verify_locations(cafile=self.ca_cert)
+        return context
+
+    def _build_client(self):
+        context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=self.ca_cert)
+        context.load_cert_chain(certfile=self.client_cert, keyfile=self.client_key)
+        return context
+
+    def server_context(self):
+        """Kontekst do wrap_socket(server_side=True)"""
+        stamp = self._stamp(self.server_cert, self.server_key, self.ca_cert)
+        with self._lock:
+            if self._server_ctx is None or stamp != self._server_stamp:
+                self._server_ctx = self._build_server()
+                self._server_stamp = stamp
+                self.built += 1
+                _count_build()
+            return self._server_ctx
+
+    def client_context(self):
+        """Kontekst do połączeń wychodzących (mTLS z certyfikatem klienta)"""
+        stamp = self._stamp(self.client_cert, self.client_key, self.ca_cert)
+        with self._lock:
+            if self._client_ctx is None or stamp != self._client_stamp:
+                self._client_ctx = self._build_client()
+                self._client_stamp = stamp
+                self.built += 1
+                _count_build()
+            return self._client_ctx
+
+
+def for_spec(spec):
+    """Konteksty dla węzła opisanego przez topology.NodeSpec"""
+    return NodeTLSContexts(spec.ca_cert, spec.server_cert, spec.server_key,
+                           spec.client_cert, spec.client_key)
@@ -0,0 +1,134 @@
+import json, os, sys
+
+# Konfiguracja pierścienia w JSON:
+#
+# {
+#   "pki_dir": "pki",
+#   "ring": [1, 2, 3],                       # kolejność w pierścieniu (domyślnie kolejność "nodes")
+#   "nodes": {
+#     "1": {"host": "127.0.0.1", "port": 8441},
+#     "2": {"host": "127.0.0.1", "port": 8442, "cert_id": 1},
+#     ...
+#   }
+# }
+#
+# Dla węzła można podać server_cert/server_key/client_cert/client_key/ca_cert
+# i server_hostname; domyślnie ścieżki to pki/server/server<cert_id>.crt itd.,
+# gdzie cert_id to id węzła (albo pole "cert_id" - pozwala kilku węzłom
+# korzystać z tych samych certyfikatów przy testach dużych pierścieni).
+
+ENV_VAR = "RING_TOPOLOGY"
+
+
+class NodeSpec:
+    def __init__(self, node_id, host, port, ca_cert, server_cert, server_key,
+                 client_cert, client_key, server_hostname="localhost"):
+        self.node_id = node_id
+        self.host = host
+        self.port = port
+        self.ca_cert = ca_cert
+        self.server_cert = server_cert
+        self.server_key = server_key
+        self.client_cert = client_cert
+        self.client_key = client_key
+        self.server_hostname = server_hostname
+
+
+class RingTopology:
+    """Węzły pierścienia z policzonymi z góry następnikami (wyszukiwanie O(1))"""
+
+    def __init__(self, nodes, order):
+        self.nodes = nodes  # id -> NodeSpec
+        self.order = list(order)
+        if len(set(self.order)) != len(self.order):
+            raise ValueError("ring order contains duplicate node ids")
+        missing = [i for i in self.order if i not in nodes]
+        if missing:
+            raise ValueError(f"ring order refers to unknown nodes: {missing}")
+        self.successor = {node_id: self.order[(pos + 1) % len(self.order)]
+                          for pos, node_id in enumerate(self.order)}
+        self.position = {node_id: pos for pos, node_id in enumerate(self.order)}
+
+    def __len__(self):
+        return len(self.order)
+
+    def spec(self, node_id):
+        return self.nodes[node_id]
+
+    def next_of(self, node_id):
+        return self.nodes[self.successor[node_id]]
+
+    # Drzewo k-arne nad kolejnością pierścienia, zakorzenione w dowolnym węźle:
+    # węzeł na pozycji i (licząc od korzenia) ma rodzica (i-1)//k i dzieci k*i+1..k*i+k.
+
+    def _tree_index(self, node_id, root):
+        return (self.position[node_id] - self.position[root]) % len(self.order)
+
+    def _tree_node(self, index, root):
+        return self.order[(self.position[root] + index) % len(self.order)]
+
+    def tree_parent(self, node_id, root, k):
+        index = self._tree_index(node_id, root)
+        if index == 0:
+            return None
+        return self._tree_node((index - 1) // k, root)
+
+    def tree_children(self, node_id, root, k):
+        index = self._tree_index(node_id, root)
+        first = k * index + 1
+        return [self._tree_node(i, root) for i in range(first, min(first + k, len(self.order)))]
+
+    @classmethod
+    def from_dict(cls, cfg):
+        pki_dir = cfg.get("pki_dir", "pki")
+        nodes = {}
+        for key, entry in cfg["nodes"].items():
+            node_id = int(key)
+            cert_id = entry.get("cert_id", node_id)
+            nodes[node_id] = NodeSpec(
+                node_id,
+                entry.get("host", "127.0.0.1"),
+                int(entry["port"]),
+                ca_cert=entry.get("ca_cert", cfg.get("ca_cert", f"{pki_dir}/ca/ca.crt")),
+                server_cert=entry.get("server_cert", f"{pki_dir}/server/server{cert_id}.crt"),
+                server_key=entry.get("server_key", f"{pki_dir}/server/server{cert_id}.key"),
+                client_cert=entry.get("client_cert", f"{pki_dir}/client/client{cert_id}.crt"),
+                client_key=entry.get("client_key", f"{pki_dir}/client/client{cert_id}.key"),
+                server_hostname=entry.get("server_hostname", "localhost"),
+            )
+        order = cfg.get("ring", list(nodes))
+        return cls(nodes, [int(i) for i in order])
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def generate(num_nodes, base_port=8441, host="127.0.0.1", cert_ids=(1, 2, 3)):
+    """Konfiguracja num_nodes węzłów na kolejnych portach, certyfikaty brane po kolei z cert_ids"""
+    return {
+        "pki_dir": "pki",
+        "ring": list(range(1, num_nodes + 1)),
+        "nodes": {
+            str(i): {"host": host, "port": base_port + i - 1,
+                     "cert_id": cert_ids[(i - 1) % len(cert_ids)]}
+            for i in range(1, num_nodes + 1)
+        },
+    }
+
+
+def load_default():
+    """Topologia z pliku wskazanego przez RING_TOPOLOGY, a bez niej - 3 węzły na localhost"""
+    path = os.environ.get(ENV_VAR)
+    if path:
+        return RingTopology.load(path)
+    return RingTopology.from_dict(generate(3))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python3 topology.py <num_nodes> [base_port] > ring.json")
+        sys.exit(1)
+    base_port = int(sys.argv[2]) if len(sys.argv) == 3 else 8441
+    print(json.dumps(generate(int(sys.argv[1]), base_port), indent=2))
@@ -0,0 +1,104 @@
+import struct, uuid
+import numpy as np
+
+# Binarny format wiadomości pierścienia (treść jednej ramki z ring_link):
+#
+#   nagłówek (26 B, big-endian):
+#     version   B   wersja formatu
+#     flags     B   FLAG_VECTOR - treść to wektor, FLAG_HAS_R - po sumie jest maska R
+#     kind      B   KIND_RING - suma w pierścieniu, KIND_TREE_* - tryb drzewa,
+#                   KIND_SHARE / KIND_SHARE_PARTIAL - tryb udziałów addytywnych
+#     arity     B   stopień drzewa k (0 w trybie pierścienia)
+#     width     H   szerokość elementu w bajtach
+#     initiator H   id węzła inicjatora
+#     session   16s id sesji (uuid)
+#     count     I   liczba elementów (1 dla skalara)
+#   treść:
+#     skalar - liczba bez znaku big-endian na width bajtach (dowolnie duże moduły)
+#     wektor - count elementów int little-endian na width bajtach
+#   przy FLAG_HAS_R druga treść o tym samym kształcie z maską R (server3/client3)
+
+VERSION = 2
+FLAG_VECTOR = 0x01
+FLAG_HAS_R = 0x02
+
+KIND_RING = 0
+KIND_TREE_MASK = 1  # węzeł -> węzeł (poza korzeniem): maska pary, nadawca ją odejmuje, odbiorca dodaje
+KIND_TREE_UP = 2    # dziecko -> rodzic: zamaskowana suma częściowa poddrzewa
+KIND_SHARE = 3          # węzeł -> węzeł: jeden udział addytywny wartości nadawcy
+KIND_SHARE_PARTIAL = 4  # węzeł -> inicjator: suma udziałów otrzymanych przez węzeł
+KIND_TREE_START = 5     # inicjator (korzeń) -> węzeł: początek sesji w trybie drzewa
+
+HEADER = struct.Struct("!BBBBHH16sI")
+
+
+def _body(value):
+    if isinstance(value, np.ndarray):
+        width = value.dtype.itemsize
+        # na maszynach little-endian astype(copy=False) nie kopiuje
+        return width, value.size, value.astype(f"<i{width}", copy=False).tobytes()
+    value = int(value)
+    if value < 0:
+        raise ValueError("scalar sums must be non-negative")
+    width = max(1, (value.bit_length() + 7) // 8)
+    return width, 1, value.to_bytes(width, "big")
+
+
+def encode(msg):
+    """{'sum', 'initiator', 'session'[, 'R', 'kind', 'arity']} -> bytes"""
+    value = msg["sum"]
+    flags = FLAG_VECTOR if isinstance(value, np.ndarray) else 0
+    width, count, body = _body(value)
+    parts = [None, body]
+    if "R" in msg:
+        flags |= FLAG_HAS_R
+        r_width, r_count, r_body = _body(msg["R"])
+        if r_count != count:
+            raise ValueError("R must have the same shape as sum")
+        # obie treści muszą mieć tę samą szerokość elementu
+        if r_width != width:
+            width = max(width, r_width)
+            body = _resize(value, width)
+            r_body = _resize(msg["R"], width)
+            parts[1] = body
+        parts.append(r_body)
+    session = msg.get("session")
+    session_bytes = uuid.UUID(hex=session).bytes if session else bytes(16)
+    parts[0] = HEADER.pack(VERSION, flags, msg.get("kind", KIND_RING), msg.get("arity", 0),
+                           width, msg["initiator"], session_bytes, count)
+    return b"".join(parts)
+
+
+def _resize(value, width):
+    if isinstance(value, np.ndarray):
+        return value.astype(f"<i{width}").tobytes()
+    return int(value).to_bytes(width, "big")
+
+
+def _read_body(view, flags, width, count):
+    if flags & FLAG_VECTOR:
+        # np.frombuffer nie kopiuje - tablica wskazuje na bufor ramki
+        return np.frombuffer(view, dtype=f"<i{width}", count=count)
+    return int.from_bytes(view, "big")
+
+
+def decode(buf):
+    """bytes/bytearray/memoryview -> dict jak w encode"""
+    view = memoryview(buf)
+    version, flags, kind, arity, width, initiator, session_bytes, count = HEADER.unpack_from(view)
+    if version != VERSION:
+        raise ValueError(f"unsupported wire version {version}")
+    size = width * count
+    start = HEADER.size
+    if len(view) != start + size * (2 if flags & FLAG_HAS_R else 1):
+        raise ValueError("truncated or oversized ring message")
+    msg = {
+        "sum": _read_body(view[start:start + size], flags, width, count),
+        "initiator": initiator,
+        "kind": kind,
+        "arity": arity,
+        "session": uuid.UUID(bytes=bytes(session_bytes)).hex,
+    }
+    if flags & FLAG_HAS_R:
+        msg["R"] = _read_body(view[start + size:start + 2 * size], flags, width, count)
+    return msg
@@ -0,0 +1,219 @@
+import json, os, random, sys, tempfile, threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from rng import make_rng
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Generowanie liczb pierwszych dla modułów RSA (L3Z2.GenModulus) bez sympy:
+#   - random_prime(lo, hi, rng)  - losowa liczba pierwsza z [lo, hi), test Millera-Rabina
+#   - KeyStore(path)             - trwała pula par (p, q) w pliku JSON, wydawanych
+#                                  po jednej (każda para trafia tylko do jednego klucza)
+#   - KeyStore.fill / fill_async - dopełnianie puli w puli procesów
+#
+# Plik puli: FSI_KEYSTORE albo fsi_keys.json w bieżącym katalogu. Wypełnienie z linii poleceń:
+#   python3 keygen.py <bity_liczby_pierwszej> <liczba_par> [procesy]
+
+ENV_VAR = "FSI_KEYSTORE"
+DEFAULT_PATH = "fsi_keys.json"
+
+_SMALL_PRIMES = [p for p in range(3, 1000) if all(p % d for d in range(2, int(p ** 0.5) + 1))]
+
+
+def is_probable_prime(n, rng=None, rounds=40):
+    if n < 2:
+        return False
+    if n == 2:
+        return True
+    for p in _SMALL_PRIMES:
+        if n % p == 0:
+            return n == p
+    if n % 2 == 0:
+        return False
+    rng = rng if rng is not None else make_rng("csprng")
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for _ in range(rounds):
+        x = pow(rng.randrange(2, n - 1), d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def random_prime(lo, hi, rng=None):
+    """Losowa liczba pierwsza z [lo, hi)"""
+    rng = rng if rng is not None else make_rng("csprng")
+    if hi - lo < 3:
+        raise ValueError("empty prime range")
+    while True:
+        n = rng.randrange(lo, hi) | 1
+        if n < hi and is_probable_prime(n, rng):
+            return n
+
+
+def _prime_pair(bits):
+    # w procesie roboczym - własny CSPRNG, para p != q z [2^bits, 2^(bits+1))
+    rng = make_rng("csprng")
+    p = random_prime(2 ** bits, 2 ** (bits + 1), rng)
+    q = p
+    while q == p:
+        q = random_prime(2 ** bits, 2 ** (bits + 1), rng)
+    return bits, p, q
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return
+    # msvcrt.locking blokuje pierwszy bajt pliku; LK_LOCK poddaje się po ~10 s, więc ponawiamy
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            pass
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class KeyStore:
+    """Pula par (p, q) zapisywana w pliku JSON: {"<bity>": [[p, q], ...]}"""
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get(ENV_VAR, DEFAULT_PATH)
+        self.lock = threading.Lock()
+        self._fill_thread = None
+
+    @contextmanager
+    def _locked(self):
+        # threading.Lock dla wątków tego procesu, flock na pliku <pula>.lock dla
+        # innych procesów - odczyt, zmiana i zapis puli muszą być niepodzielne
+        with self.lock, open(self.path + ".lock", "a") as lock_file:
+            _lock_file(lock_file)
+            try:
+                yield
+            finally:
+                _unlock_file(lock_file)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save(self, data):
+        # zapis przez unikalny plik tymczasowy w tym samym katalogu, żeby przerwany zapis nie psuł puli
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.chmod(tmp, 0o600)  # tajne liczby pierwsze
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def available(self, bits):
+        with self._locked():
+            return len(self._load().get(str(bits), []))
+
+    def take(self, bits):
+        """Wyjmuje parę (p, q) z puli (usuwa ją z pliku); None gdy pusta"""
+        with self._locked():
+            data = self._load()
+            pairs = data.get(str(bits))
+            if not pairs:
+                return None
+            p, q = pairs.pop()
+            self._save(data)
+            return p, q
+
+    def add(self, bits, pairs):
+        with self._locked():
+            data = self._load()
+            data.setdefault(str(bits), []).extend([p, q] for p, q in pairs)
+            self._save(data)
+
+    def fill(self, bits, count, processes=None):
+        """Dopełnia pulę dla danej liczby bitów do count par, licząc w puli procesów"""
+        missing = count - self.available(bits)
+        if missing <= 0:
+            return 0
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for _, p, q in pool.map(_prime_pair, [bits] * missing):
+                self.add(bits, [(p, q)])
+        return missing
+
+    def fill_async(self, bits, count, processes=None):
+        # fill w wątku w tle; obliczenia i tak idą w procesach, więc wątek tylko czeka
+        if self._fill_thread is not None and self._fill_thread.is_alive():
+            return self._fill_thread
+        self._fill_thread = threading.Thread(target=self.fill, args=(bits, count, processes), daemon=True)
+        self._fill_thread.start()
+        return self._fill_thread
+
+
+_default_store = None
+
+
+def default_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = KeyStore()
+    return _default_store
+
+
+def prime_pair(bits, rng=None, store=None):
+    """Para (p, q) z [2^bits, 2^(bits+1)): z puli, a gdy pusta - liczona od razu.
+
+    Z generatorem symulacyjnym (make_rng("sim", ...)) pula jest pomijana, żeby
+    wynik zależał tylko od ziarna; z CSPRNG albo bez rng - najpierw pula, o ile
+    jej plik istnieje. Niedostępna pula (OSError) to też generowanie na miejscu.
+    """
+    if rng is None or isinstance(rng, random.SystemRandom):
+        store = store or default_store()
+        pair = None
+        if os.path.exists(store.path):
+            try:
+                pair = store.take(bits)
+            except OSError:
+                pair = None
+        if pair is not None:
+            return pair
+    rng = rng if rng is not None else make_rng("csprng")
+    p = random_prime(2 ** bits, 2 ** (bits + 1), rng)
+    q = p
+    while q == p:
+        q = random_prime(2 ** bits, 2 ** (bits + 1), rng)
+    return p, q
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python3 keygen.py <prime_bits> <count> [processes]")
+        sys.exit(1)
+    bits, count = int(sys.argv[1]), int(sys.argv[2])
+    processes = int(sys.argv[3]) if len(sys.argv) == 4 else None
+    store = default_store()
+    added = store.fill(bits, count, processes)
+    print(f"{store.path}: {store.available(bits)} pairs of {bits}-bit primes ({added} new)")
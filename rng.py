@@ -0,0 +1,76 @@
+import random
+
+import numpy as np
+
+# Wspólne źródła losowości dla symulatorów (L2Z2, L3Z1, L3Z2).
+# Każdy symulator przyjmuje obiekt z API random.Random (randint, shuffle,
+# choice, randbytes, getrandbits, ...), więc można podać:
+#   - make_rng("sim", seed)  - szybki licznikowy generator Philox, powtarzalny
+#                              dla danego seed, niezależne strumienie przez spawn()
+#   - make_rng("csprng")     - random.SystemRandom (os.urandom) do prawdziwych uruchomień
+
+
+class CounterRNG(random.Random):
+    """Generator licznikowy Philox (numpy) z interfejsem random.Random.
+
+    Stan to tylko klucz i licznik, więc strumienie z spawn() są od siebie
+    niezależne i mogą być używane w osobnych procesach bez wspólnego stanu.
+    """
+
+    _BLOCK = 1024
+
+    def __init__(self, seed=None):
+        super().__init__(seed)
+
+    def seed(self, a=None, version=2):
+        self._seq = a if isinstance(a, np.random.SeedSequence) else np.random.SeedSequence(a)
+        self._bitgen = np.random.Philox(self._seq)
+        self.generator = np.random.Generator(self._bitgen)  # dla kodu wektorowego
+        self._words = []
+        self.gauss_next = None
+
+    def _word(self):
+        if not self._words:
+            self._words = self._bitgen.random_raw(self._BLOCK).tolist()
+        return self._words.pop()
+
+    def random(self):
+        return (self._word() >> 11) * (1.0 / 9007199254740992.0)
+
+    def getrandbits(self, k):
+        if k <= 64:
+            return self._word() >> (64 - k) if k else 0
+        words = (k + 63) // 64
+        # pierwsze słowo najbardziej znaczące; from_bytes zamiast przesunięć (liniowo, nie kwadratowo)
+        raw = np.array([self._word() for _ in range(words)], dtype=">u8").tobytes()
+        return int.from_bytes(raw, "big") >> (words * 64 - k)
+
+    def getstate(self):
+        return self._bitgen.state, list(self._words)
+
+    def setstate(self, state):
+        self._bitgen.state, words = state
+        self._words = list(words)
+
+    def spawn(self, n):
+        return [CounterRNG(seq) for seq in self._seq.spawn(n)]
+
+
+def make_rng(mode="sim", seed=None):
+    if mode == "sim":
+        return CounterRNG(seed)
+    if mode == "csprng":
+        if seed is not None:
+            raise ValueError("csprng mode cannot be seeded")
+        return random.SystemRandom()
+    raise ValueError(f"unknown rng mode {mode!r}")
+
+
+def numpy_generator(rng):
+    """numpy.random.Generator zgodny z podanym źródłem (dla wersji wsadowych)"""
+    if isinstance(rng, np.random.Generator):
+        return rng
+    generator = getattr(rng, "generator", None)
+    if generator is not None:
+        return generator
+    return np.random.default_rng(rng.getrandbits(128))